@@ -0,0 +1,139 @@
+import asyncio
+from functools import partial
+import Concurrency
+
+
+# Asyncio front end of the social network.
+
+class AsyncSocialNetwork:
+    """
+    Exposes a SocialNetwork to asyncio code as coroutines.
+
+    Every call into the network runs on an executor (the default thread pool unless one is given),
+    so printing, image decoding and persistence never block the event loop.
+    Concurrency mode is turned on since the calls run on several threads.
+    The fan-out of new posts is deferred: publish_post returns as soon as the post is stored,
+    and a background task delivers the notifications batches_per_step batches at a time,
+    yielding to the event loop between steps, so a post of a user with a huge number of
+    followers doesn't stall the other coroutines.
+    close puts the concurrency mode and the fan-out mode back as they were before.
+
+    Attributes:
+        network (SocialNetwork): The wrapped network.
+        executor: The executor running the calls, None for the default one of the loop.
+        batches_per_step (int): The number of fan-out batches delivered between two yields.
+    """
+
+    def __init__(self, network, executor=None, batches_per_step: int = 1):
+        self._was_concurrent = Concurrency.enabled()
+        Concurrency.enable()
+        self.network = network
+        self.executor = executor
+        self.batches_per_step = batches_per_step
+        self.fanout = network.graph.fanout
+        self._was_deferred = self.fanout.deferred
+        self.fanout.deferred = True
+        self._wakeup = None
+        self._drainer = None
+
+    """
+    Starts the background fan-out task, must be called from a running event loop.
+    """
+
+    def start(self):
+        if self._drainer is None:
+            self._wakeup = asyncio.Event()
+            self._drainer = asyncio.get_running_loop().create_task(self._drain_forever())
+
+    """
+    Delivers the queued notifications, stops the background fan-out task
+    and restores the concurrency and fan-out modes found by the constructor.
+    """
+
+    async def close(self):
+        await self.flush()
+        if self._drainer is not None:
+            self._drainer.cancel()
+            try:
+                await self._drainer
+            except asyncio.CancelledError:
+                pass
+            self._drainer = None
+        self.fanout.deferred = self._was_deferred
+        # Deliveries queued after the flush must not wait for a drainer that is gone
+        self.fanout.flush()
+        if not self._was_concurrent:
+            Concurrency.disable()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def sign_up(self, username: str, password: str):
+        return await self._run(self.network.sign_up, username, password)
+
+    async def log_in(self, username: str, password: str):
+        return await self._run(self.network.log_in, username, password)
+
+    async def log_out(self, username: str):
+        return await self._run(self.network.log_out, username)
+
+    async def follow(self, user, other):
+        return await self._run(user.follow, other)
+
+    async def unfollow(self, user, other):
+        return await self._run(user.unfollow, other)
+
+    """
+    Publishes a post of user and wakes the background fan-out task up.
+    """
+
+    async def publish_post(self, user, post_type: str, *args, **kwargs):
+        post = await self._run(partial(user.publish_post, post_type, *args, **kwargs))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return post
+
+    async def like(self, post, user):
+        return await self._run(post.like, user)
+
+    async def comment(self, post, user, text: str):
+        return await self._run(post.comment, user, text)
+
+    async def timeline(self, user, limit: int = 20):
+        return await self._run(self.network.timeline, user, limit)
+
+    async def get_notifications(self, user, after: int = None, limit: int = 20):
+        return await self._run(user.get_notifications, after, limit)
+
+    """
+    Decodes the image of an image post on the executor and returns it.
+    """
+
+    async def load_image(self, post):
+        return await self._run(lambda: post.image)
+
+    async def save(self, path: str):
+        return await self._run(self.network.save, path)
+
+    """
+    Delivers all the queued notifications, yielding to the event loop between steps.
+    """
+
+    async def flush(self):
+        while self.fanout.has_pending():
+            self.fanout.drain(self.batches_per_step)
+            await asyncio.sleep(0)
+
+    async def _drain_forever(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args))
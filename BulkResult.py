@@ -0,0 +1,45 @@
+# The outcome of a bulk operation of the network.
+
+class BulkResult:
+    """
+    Collects the outcome of every item of a bulk operation (bulk sign up, follow or like).
+
+    A rejected item doesn't stop the operation, it is recorded with the reason
+    the single item call would have raised.
+
+    Attributes:
+        done (list): The results of the applied items (e.g. the created users), in input order.
+        failures (list): A (index, item, reason) tuple for every rejected item, in input order.
+    """
+
+    def __init__(self):
+        self.done = []
+        self.failures = []
+
+    """
+    Records an applied item.
+    """
+
+    def add(self, result):
+        self.done.append(result)
+
+    """
+    Records a rejected item with its position in the input and the reason.
+    """
+
+    def fail(self, index: int, item, reason: str):
+        self.failures.append((index, item, reason))
+
+    """
+    True if no item was rejected.
+    """
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def __len__(self):
+        return len(self.done) + len(self.failures)
+
+    def __str__(self):
+        return str(len(self.done)) + " done, " + str(len(self.failures)) + " failed"
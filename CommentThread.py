@@ -0,0 +1,88 @@
+import time
+from array import array
+import PostFactory
+
+
+# The comments written on a post.
+
+class CommentThread:
+    """
+    The comments of a post in the order they were written, append only.
+
+    Every comment gets a sequence number, its position in the thread (the first one is 1),
+    used as the cursor of get_comments.
+    The comments are kept in parallel arrays (ids of the commenters, times and texts),
+    so a comment costs its text and 12 bytes, and a page only builds Comment records
+    for the comments it returns, however long the thread is.
+
+    Attributes:
+        post (Post): The commented post.
+        users (array): The ids of the commenters.
+        times (array): The times of the comments in seconds since the epoch.
+        texts (list): The texts of the comments.
+    """
+
+    __slots__ = ("post", "users", "times", "texts")
+
+    def __init__(self, post):
+        self.post = post
+        self.users = array('i')
+        self.times = array('d')
+        self.texts = []
+
+    """
+    Adds a comment of user and returns its sequence.
+    """
+
+    def append(self, user, text: str, timestamp: float = None) -> int:
+        self.users.append(user.uid)
+        self.times.append(time.time() if timestamp is None else timestamp)
+        self.texts.append(text)
+        return len(self.texts)
+
+    """
+    Returns a page of at most limit (sequence, Comment) pairs, oldest first.
+    With after=None the page starts at the first comment, otherwise at the comment following the sequence after.
+    """
+
+    def get_comments(self, after: int = None, limit: int = 20) -> list:
+        start = 0 if after is None else max(after, 0)
+        end = min(len(self.texts), start + limit)
+        return [(index + 1, self._record(index)) for index in range(start, end)]
+
+    """
+    Returns the latest limit comments as (sequence, Comment) pairs, oldest first.
+    """
+
+    def latest(self, limit: int = 20) -> list:
+        return self.get_comments(max(len(self.texts) - limit, 0), limit)
+
+    """
+    Yields the (username, text) pairs of all the comments, oldest first.
+    """
+
+    def items(self):
+        users = self.post.author.graph.users
+        for uid, text in zip(self.users, self.texts):
+            yield users[uid].username, text
+
+    """
+    Replaces the content of the thread by the given arrays, oldest first.
+    """
+
+    def restore(self, users: array, times: array, texts: list):
+        self.users = users
+        self.times = times
+        self.texts = texts
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for index in range(len(self.texts)):
+            yield self._record(index)
+
+    def _record(self, index: int):
+        post = self.post
+        return PostFactory.Comment(post.author.graph.users[self.users[index]], self.texts[index],
+                                   post.author, post, self.times[index])
@@ -0,0 +1,125 @@
+import threading
+from contextlib import contextmanager
+
+
+# Locks used when the network is served from several threads.
+#
+# Concurrency mode is off by default and then every striped lock is a no-op.
+# Call enable() before starting the threads that use the network.
+#
+# Consistency model:
+#   - sign_up, log_in and log_out are atomic per username (names stripes),
+#     log_in/log_out also hold the user stripe so they are atomic with the actions of that user.
+#   - follow and unfollow are atomic per user (users stripes) for their checks,
+#     and the arrays of the graph are changed under the edges lock of the graph,
+#     so every follow/unfollow is applied completely and none is lost.
+#   - like, comment, discount and sold are atomic per post (posts stripes).
+#   - publish_post is atomic per author. Its notification goes to the followers of the author
+#     at the moment the fan-out copies them; a follow racing with a publish may or may not get it.
+#   - Every notification appended to an inbox is kept (inboxes stripes), none is lost to a race.
+#   - Listeners of the graph get the events of one user or post in the order they were applied.
+#   - Readers (timelines, views, printing) aren't isolated, they may see the changes of other
+#     threads in progress but never a corrupted structure.
+#
+# Locks are always taken in this order, which rules out deadlocks:
+#   names stripes -> users stripes -> posts stripes -> edges lock of the graph
+#   -> inner locks (inboxes stripes, the locks of the feed cache, marketplace, search index, engagement
+#   counters, sorted users, fan-out, write-ahead log and graph ids).
+# A write-ahead log checkpoint saves the network while holding the log lock,
+# so saving a snapshot reads the posts without taking their stripes.
+
+
+class NoLock:
+    """
+    A lock that does nothing, used when concurrency mode is off.
+    """
+
+    def acquire(self, blocking: bool = True, timeout: float = -1):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_LOCK = NoLock()
+
+
+class LockStripes:
+    """
+    A fixed number of reentrant locks shared by many objects.
+
+    A key (a user id, a post id, a username...) is mapped to the lock at hash(key) % count,
+    so the memory taken by the locks doesn't grow with the number of objects.
+
+    Attributes:
+        count (int): The number of locks.
+        locks (list): The locks.
+        enabled (bool): Whether the locks are used, when False lock returns NO_LOCK.
+    """
+
+    def __init__(self, count: int = 256):
+        self.count = count
+        self.locks = [threading.RLock() for _ in range(count)]
+        self.enabled = False
+
+    """
+    Returns the lock of key.
+    """
+
+    def lock(self, key):
+        if not self.enabled:
+            return NO_LOCK
+        return self.locks[hash(key) % self.count]
+
+    """
+    Holds the locks of all the keys, taken in stripe order.
+    """
+
+    @contextmanager
+    def hold(self, *keys):
+        if not self.enabled:
+            yield
+            return
+        stripes = sorted({hash(key) % self.count for key in keys})
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
+
+
+names = LockStripes()
+users = LockStripes()
+posts = LockStripes()
+inboxes = LockStripes()
+
+"""
+Turns concurrency mode on.
+"""
+
+def enable():
+    for stripes in (names, users, posts, inboxes):
+        stripes.enabled = True
+
+"""
+Turns concurrency mode off.
+"""
+
+def disable():
+    for stripes in (names, users, posts, inboxes):
+        stripes.enabled = False
+
+"""
+Returns True if concurrency mode is on.
+"""
+
+def enabled() -> bool:
+    return users.enabled
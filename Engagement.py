@@ -0,0 +1,141 @@
+import threading
+from array import array
+from Leaderboard import Leaderboard
+
+
+# Counters of the activity of a network, kept up to date by listening to its graph.
+
+class Engagement:
+    """
+    Maintained engagement counters and leaderboards of a graph.
+
+    Every like, comment, post and follow updates the counters it changes in O(1),
+    so the statistics are read without walking the posts.
+    The likes of a post are counted from its likers, so a repeated like isn't counted twice.
+    The posts are ranked by likes and the users by followers in leaderboards.
+
+    Attributes:
+        graph (SocialGraph): The graph of the counted users and posts.
+        likes (int): The number of likes of all the posts.
+        comments (int): The number of comments of all the posts.
+        posts (int): The number of published posts.
+        follows (int): The number of follow relations.
+        likes_received (array): The number of likes of the posts of every user, indexed by user id.
+        comments_received (array): The number of comments on the posts of every user, indexed by user id.
+        liked_posts (Leaderboard): The post ids ranked by likes.
+        followed_users (Leaderboard): The user ids ranked by followers.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.likes = 0
+        self.comments = 0
+        self.posts = 0
+        self.follows = 0
+        self.likes_received = array('q')
+        self.comments_received = array('q')
+        self.liked_posts = Leaderboard()
+        self.followed_users = Leaderboard()
+        self._post_likes = array('i')
+        self._lock = threading.RLock()
+
+    """
+    Counts again everything from the graph, e.g. after it was loaded without events.
+    """
+
+    def rebuild(self):
+        with self._lock:
+            graph = self.graph
+            users = len(graph.users)
+            self.likes_received = array('q', [0]) * users
+            self.comments_received = array('q', [0]) * users
+            self._post_likes = array('i', (len(post.likes) for post in graph.posts))
+            for post in graph.posts:
+                self.likes_received[post.author.uid] += len(post.likes)
+                self.comments_received[post.author.uid] += len(post.comments)
+            self.likes = sum(self._post_likes)
+            self.comments = sum(self.comments_received)
+            self.posts = len(graph.posts)
+            self.follows = graph.edge_count()
+            self.liked_posts.load(enumerate(self._post_likes))
+            self.followed_users.load((uid, graph.follower_count(uid)) for uid in range(users))
+
+    """
+    Returns the counters of user: posts, followers, following, likes and comments received.
+    """
+
+    def user_stats(self, user) -> dict:
+        uid = user.uid
+        return {"posts": len(user.posts), "followers": self.graph.follower_count(uid),
+                "following": self.graph.following_count(uid),
+                "likes_received": self._user_counter(self.likes_received, uid),
+                "comments_received": self._user_counter(self.comments_received, uid)}
+
+    """
+    Returns the counters of post: likes and comments.
+    """
+
+    def post_stats(self, post) -> dict:
+        return {"likes": len(post.likes), "comments": len(post.comments)}
+
+    """
+    Returns the k most liked posts as (post, likes) pairs, most liked first.
+    """
+
+    def top_posts(self, k: int = 10) -> list:
+        with self._lock:
+            posts = self.graph.posts
+            return [(posts[post_id], likes) for post_id, likes in self.liked_posts.top(k)]
+
+    """
+    Returns the k most followed users as (user, followers) pairs, most followed first.
+    """
+
+    def top_users(self, k: int = 10) -> list:
+        with self._lock:
+            users = self.graph.users
+            return [(users[uid], followers) for uid, followers in self.followed_users.top(k)]
+
+    def on_publish(self, user, post):
+        with self._lock:
+            self.posts += 1
+            self._grow(self._post_likes, post.post_id)
+
+    def on_like(self, post, user):
+        with self._lock:
+            post_likes = self._post_likes
+            self._grow(post_likes, post.post_id)
+            # A repeated like sends the event but doesn't change the likers.
+            # Every new liker is added right before its event, hence one step per event.
+            if post_likes[post.post_id] >= len(post.likes):
+                return
+            post_likes[post.post_id] += 1
+            self.likes += 1
+            self._grow(self.likes_received, post.author.uid)
+            self.likes_received[post.author.uid] += 1
+            self.liked_posts.increment(post.post_id)
+
+    def on_comment(self, post, user, text):
+        with self._lock:
+            self.comments += 1
+            self._grow(self.comments_received, post.author.uid)
+            self.comments_received[post.author.uid] += 1
+
+    def on_follow(self, user, followed):
+        with self._lock:
+            self.follows += 1
+            self.followed_users.increment(followed.uid)
+
+    def on_unfollow(self, user, unfollowed):
+        with self._lock:
+            self.follows -= 1
+            self.followed_users.decrement(unfollowed.uid)
+
+    @staticmethod
+    def _user_counter(counters: array, uid: int) -> int:
+        return counters[uid] if uid < len(counters) else 0
+
+    @staticmethod
+    def _grow(counters: array, index: int):
+        if len(counters) <= index:
+            counters.extend(array(counters.typecode, [0]) * (index + 1 - len(counters)))
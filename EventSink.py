@@ -0,0 +1,184 @@
+import json
+import queue
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+# Sinks receiving the messages the network shows about its events (follows, posts, likes...).
+
+class EventSink(ABC):
+    """
+    Abstract base class of the destinations of the network event messages.
+
+    Every event has a kind (e.g. 'follow', 'like'), the text printed for it by the console
+    and fields describing it (e.g. user='Alice').
+    """
+
+    @abstractmethod
+    def emit(self, kind: str, text: str, **fields):
+        pass
+
+    """
+    Writes the messages kept by the sink.
+    """
+
+    def flush(self):
+        pass
+
+    """
+    Flushes the sink and releases its resources.
+    """
+
+    def close(self):
+        self.flush()
+
+
+class ConsoleSink(EventSink):
+    """
+    Prints the text of every event to the standard output, as the network always did.
+    """
+
+    def emit(self, kind: str, text: str, **fields):
+        print(text)
+
+
+class NullSink(EventSink):
+    """
+    Drops every event.
+    """
+
+    def emit(self, kind: str, text: str, **fields):
+        pass
+
+
+class BufferedSink(EventSink):
+    """
+    Writes the texts of the events to a stream in batches.
+
+    Attributes:
+        stream: The text stream written to (the standard output at write time by default).
+        batch_size (int): The number of events kept before they are written together.
+        lines (list): The texts kept since the last write.
+    """
+
+    def __init__(self, stream=None, batch_size: int = 256):
+        self.stream = stream
+        self.batch_size = batch_size
+        self.lines = []
+        self._lock = threading.Lock()
+
+    def emit(self, kind: str, text: str, **fields):
+        with self._lock:
+            self.lines.append(text)
+            if len(self.lines) < self.batch_size:
+                return
+            lines, self.lines = self.lines, []
+        self._write(lines)
+
+    def flush(self):
+        with self._lock:
+            lines, self.lines = self.lines, []
+        if lines:
+            self._write(lines)
+
+    def _write(self, lines):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write("\n".join(lines) + "\n")
+
+
+class JsonLinesSink(EventSink):
+    """
+    Writes every event as one JSON object per line: its kind, time, text and fields.
+
+    Attributes:
+        stream: The text stream written to (the standard output at write time by default).
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, kind: str, text: str, **fields):
+        record = {"event": kind, "time": time.time(), "text": text}
+        record.update(fields)
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(json.dumps(record) + "\n")
+
+    def flush(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.flush()
+
+
+class ThreadedSink(EventSink):
+    """
+    Hands the events to a background thread that forwards them to another sink,
+    so the caller never waits for the output.
+
+    Attributes:
+        sink (EventSink): The sink the events are forwarded to.
+        events (Queue): The events waiting for the background thread.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink: EventSink):
+        self.sink = sink
+        self.events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, kind: str, text: str, **fields):
+        self.events.put((kind, text, fields))
+
+    """
+    Waits until the background thread forwarded all the events, then flushes the inner sink.
+    """
+
+    def flush(self):
+        self.events.join()
+        self.sink.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.events.put(ThreadedSink._STOP)
+            self._thread.join()
+        self.sink.close()
+
+    def _run(self):
+        while True:
+            event = self.events.get()
+            try:
+                if event is ThreadedSink._STOP:
+                    return
+                kind, text, fields = event
+                self.sink.emit(kind, text, **fields)
+            finally:
+                self.events.task_done()
+
+
+# The sink receiving the events of the network.
+_sink = ConsoleSink()
+
+"""
+Returns the sink receiving the events of the network.
+"""
+
+def get_sink() -> EventSink:
+    return _sink
+
+"""
+Replaces the sink receiving the events of the network and returns the previous one.
+"""
+
+def set_sink(sink: EventSink) -> EventSink:
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+"""
+Sends an event to the current sink.
+"""
+
+def emit(kind: str, text: str, **fields):
+    _sink.emit(kind, text, **fields)
@@ -3,6 +3,28 @@ import User
 import PostFactory
 
 # A class for defining custom exceptions used in the project.
+#
+# The actions of the network are checked by the guard functions at the bottom of this module.
+# A guard only reads the state it checks and creates nothing when the check passes,
+# the typed exception is built only when the action is refused.
+
+# The messages of the refused actions.
+NOT_CONNECTED = "User is not connected"
+CANT_PUBLISH = "User cant publish a post while disconnected"
+CANT_FOLLOW = "User is not connected, cant follow"
+CANT_UNFOLLOW = "User is not connected, cant unfollow"
+NOT_FOLLOWED = "This user cant unfollow unfollowed user"
+FOLLOW_YOURSELF = "You can't follow yourself!"
+OTHER_NETWORK = "You can't follow a user of another network"
+POST_OTHER_NETWORK = "You can't interact with a post of another network"
+ALREADY_LOGGED_IN = "User already logged in"
+NOT_EXIST = "User does not exist"
+ALREADY_LOGGED_OUT = "User already logged out"
+NOT_FOUND = "User not found"
+ALREADY_EXIST = "User already exist"
+INVALID_PASSWORD = "You should enter a valid password"
+INVALID_USERNAME = "You should enter a valid username"
+
 
 class NotOnlineNotificationError(Exception):
     """
@@ -14,7 +36,8 @@ class NotOnlineNotificationError(Exception):
 
     """
 
-    def __init__(self, user: User, post: PostFactory):
+    def __init__(self, user: User, post: PostFactory, message: str = ""):
+        super().__init__(message)
         self.post = post
         self.user = user
 
@@ -22,26 +45,19 @@ class NotOnlineNotificationError(Exception):
     Raises an exception if the user is not connected when trying to like a post.
     """
     def cantLike(self):
-        try:
-            not self.user.connected and self.post.like(self.user)
-        except Exception:
-            raise Exception("User is not connected")
+        ensure_can_like(self.user, self.post)
 
     """
     Raises an exception if the user is not connected when trying to comment on a post.
     """
     def cantComment(self):
-        try:
-            not self.user.connected and self.post.comment(self.user)
-        except Exception:
-            raise Exception("User is not connected")
+        ensure_can_comment(self.user, self.post)
 
     """
     Raises an exception if the user is not connected when trying to publish a post.
     """
     def cantPublish(self):
-        if not self.user.connected:
-            raise Exception("User cant publish a post while disconnected")
+        ensure_can_publish(self.user, self.post)
 
 
 
@@ -53,7 +69,8 @@ class UsertoUserError(Exception):
         user1: The first user involved in the error.
         user2: The second user involved in the error.
     """
-    def __init__(self, user1: User, user2: User):
+    def __init__(self, user1: User, user2: User, message: str = ""):
+        super().__init__(message)
         self.user1 = user1
         self.user2 = user2
 
@@ -63,10 +80,8 @@ class UsertoUserError(Exception):
         user2: The user being followed.
     """
     def cantFollow(self, user1, user2):
-        try:
-            not user1.connected and user1.follow(user2)
-        except Exception:
-            raise Exception("User is not connected, cant follow")
+        if not user1.connected:
+            raise UsertoUserError(user1, user2, CANT_FOLLOW)
 
     """
     Raises an exception if user1 is not connected when trying to unfollow user2.
@@ -75,24 +90,22 @@ class UsertoUserError(Exception):
     """
 
     def cantUnFollow(self, user1, user2):
-        try:
-            not user1.connected and user1.unfollow(user2)
-        except Exception:
-            raise Exception("User is not connected, cant unfollow")
+        if not user1.connected:
+            raise UsertoUserError(user1, user2, CANT_UNFOLLOW)
 
     """
     Raises an exception if user1 tries to unfollow a user who isn't being followed.
     """
     def cantUnfollowIsntFollowed(self):
         if self.user2 not in self.user1.following:
-            raise Exception("This user cant unfollow unfollowed user")
+            raise UsertoUserError(self.user1, self.user2, NOT_FOLLOWED)
 
     """
     Raises an exception if user tries to follow themselves.
     """
     def cantFollowYourSelf(self):
         if self.user1 is self.user2:
-            raise Exception("You can't follow yourself!")
+            raise UsertoUserError(self.user1, self.user2, FOLLOW_YOURSELF)
 
 
 
@@ -106,7 +119,8 @@ class LogInLogoutError(Exception):
         name: The name of the user involved in the error.
     """
 
-    def __init__(self,network:SocialNetwork,name:str):
+    def __init__(self,network:SocialNetwork,name:str, message: str = ""):
+        super().__init__(message)
         self.network = network
         self.name = name
 
@@ -115,58 +129,134 @@ class LogInLogoutError(Exception):
     """
 
     def logInError(self, username, passward):
-        for user in self.network.users:
-            if user.username == username and user.password == passward:
-             raise Exception("User already logged in")
+        user = self.network.registry.get(username)
+        if user is not None and user.connected and user.password == passward:
+            raise LogInLogoutError(self.network, username, ALREADY_LOGGED_IN)
 
     """
     Raises an exception if the user isn't exist and try to log in.
     """
     def logInUserIsentExistError(self, username, password):
-        size_users = len(self.network.users)
-        i = 0
-        c = 0
-        size_loggedout = len(self.network.logedoutUsers)
-        for user in self.network.users:
-            if not(user.username == username and user.password == password):
-                i+=1
-        for user in self.network.logedoutUsers:
-            if not(user.username == username and user.password == password):
-                c+=1
-        if i == size_users and c == size_loggedout:
-            raise Exception("User does not exist")
+        user = self.network.registry.get(username)
+        if user is None or user.password != password:
+            raise LogInLogoutError(self.network, username, NOT_EXIST)
 
     """
     Raises an exception if the user is already logged out.
     """
     def logOutError(self, username):
-        for user in self.network.logedoutUsers:
-            if user.username == username:
-             raise Exception("User already logged out")
+        user = self.network.registry.get(username)
+        if user is not None and not user.connected:
+            raise LogInLogoutError(self.network, username, ALREADY_LOGGED_OUT)
 
     """
     Raises an exception if the user is not found (user is either connected or not exist).
     """
     def loggedOutNotFound(self,username):
-        size = len(self.network.users)
-        i = 0
-        for user in self.network.users:
-            if user.username != username:
-                i+=1
-        if i == size:
-            raise Exception("User not found")
+        user = self.network.registry.get(username)
+        if user is None or not user.connected:
+            raise LogInLogoutError(self.network, username, NOT_FOUND)
 
     """
     Raises an exception if the user already exists during sign-up.
+    Usernames are unique, so the check is a single lookup in the network registry.
     """
     def signUpError(self, username, password):
-       for user in self.network.users:
-          if user.username is username and user.password is password:
-                raise Exception("User already exist")
+        if username in self.network.registry:
+            raise LogInLogoutError(self.network, username, ALREADY_EXIST)
 
     """
     Raises an exception if the password is not valid during sign-up.
     """
     def notValidPassword(self, password):
         if not 4 <= len(password) <= 8:
-            raise Exception("You should enter a valid password")
+            raise LogInLogoutError(self.network, self.name, INVALID_PASSWORD)
+
+
+"""
+Raises NotOnlineNotificationError if user is not connected when trying to like post
+or belongs to another network than the post (likes are kept as ids of the graph of the post).
+"""
+
+def ensure_can_like(user, post):
+    if not user.connected:
+        raise NotOnlineNotificationError(user, post, NOT_CONNECTED)
+    if user.graph is not post.author.graph:
+        raise NotOnlineNotificationError(user, post, POST_OTHER_NETWORK)
+
+"""
+Raises NotOnlineNotificationError if user is not connected when trying to comment on post
+or belongs to another network than the post (comments keep the id of their writer in the graph of the post).
+"""
+
+def ensure_can_comment(user, post):
+    if not user.connected:
+        raise NotOnlineNotificationError(user, post, NOT_CONNECTED)
+    if user.graph is not post.author.graph:
+        raise NotOnlineNotificationError(user, post, POST_OTHER_NETWORK)
+
+"""
+Raises NotOnlineNotificationError if user is not connected when trying to publish post.
+"""
+
+def ensure_can_publish(user, post):
+    if not user.connected:
+        raise NotOnlineNotificationError(user, post, CANT_PUBLISH)
+
+"""
+Raises UsertoUserError if user1 can't follow user2:
+user1 is not connected, follows itself or user2 belongs to another network.
+"""
+
+def ensure_can_follow(user1, user2):
+    if not user1.connected:
+        raise UsertoUserError(user1, user2, CANT_FOLLOW)
+    if user1 is user2:
+        raise UsertoUserError(user1, user2, FOLLOW_YOURSELF)
+    if user1.graph is not user2.graph:
+        raise UsertoUserError(user1, user2, OTHER_NETWORK)
+
+"""
+Raises UsertoUserError if user1 can't unfollow user2:
+user1 is not connected, unfollows itself or doesn't follow user2.
+"""
+
+def ensure_can_unfollow(user1, user2):
+    if not user1.connected:
+        raise UsertoUserError(user1, user2, CANT_UNFOLLOW)
+    if user1 is user2:
+        raise UsertoUserError(user1, user2, FOLLOW_YOURSELF)
+    if user1.graph is not user2.graph or not user1.graph.is_following(user1.uid, user2.uid):
+        raise UsertoUserError(user1, user2, NOT_FOLLOWED)
+
+"""
+Raises LogInLogoutError if username is taken or password isn't valid.
+"""
+
+def ensure_can_sign_up(network, username: str, password: str):
+    if username in network.registry:
+        raise LogInLogoutError(network, username, ALREADY_EXIST)
+    if not 4 <= len(password) <= 8:
+        raise LogInLogoutError(network, username, INVALID_PASSWORD)
+
+"""
+Raises LogInLogoutError if the user is already logged in, doesn't exist or the password is wrong.
+"""
+
+def ensure_can_log_in(network, username: str, password: str):
+    user = network.registry.get(username)
+    if user is None or user.password != password:
+        raise LogInLogoutError(network, username, NOT_EXIST)
+    if user.connected:
+        raise LogInLogoutError(network, username, ALREADY_LOGGED_IN)
+
+"""
+Raises LogInLogoutError if the user is already logged out or doesn't exist.
+"""
+
+def ensure_can_log_out(network, username: str):
+    user = network.registry.get(username)
+    if user is None:
+        raise LogInLogoutError(network, username, NOT_FOUND)
+    if not user.connected:
+        raise LogInLogoutError(network, username, ALREADY_LOGGED_OUT)
@@ -0,0 +1,177 @@
+import threading
+from array import array
+from bisect import bisect_right
+from collections import deque
+import Concurrency
+
+
+# Delivers the "new post" notifications of a user to its followers.
+
+class FanOut:
+    """
+    Fan-out engine for the notifications sent when a user publishes a post.
+
+    The notification is formatted once per post and appended to the inboxes
+    of the followers in batches of batch_size.
+    In deferred mode publish only queues the delivery and returns,
+    and the queue is delivered by drain, flush or a background worker started with start.
+    Authors with more than pull_threshold followers aren't pushed at all:
+    their notifications are kept on the engine and pulled by each follower when it reads its notifications.
+
+    Attributes:
+        graph (SocialGraph): The graph of the users.
+        batch_size (int): The number of followers handled in one batch.
+        deferred (bool): Whether publish queues the delivery instead of doing it right away.
+        pull_threshold (int): Authors with more followers than this are pulled instead of pushed.
+        pull_history (int): The number of notifications kept for every pulled author.
+        pending (deque): Queued deliveries, each one is [notification, follower ids, next position].
+        pulled (dict): Notifications of pulled authors as (sequence, notification) lists keyed by author id.
+        cursors (array): For every user id, the sequence of the last pulled notification.
+        sequence (int): The number of notifications published so far.
+    """
+
+    def __init__(self, graph, batch_size: int = 1024, deferred: bool = False,
+                 pull_threshold: int = 100000, pull_history: int = 1000):
+        self.graph = graph
+        self.batch_size = batch_size
+        self.deferred = deferred
+        self.pull_threshold = pull_threshold
+        self.pull_history = pull_history
+        self.pending = deque()
+        self.pulled = dict()
+        self.cursors = array('q')
+        self.sequence = 0
+        self._condition = threading.Condition()
+        self._worker = None
+        self._running = False
+
+    """
+    Registers a new user id, so it pulls only notifications published after it joined.
+    """
+
+    def add_user(self, uid: int):
+        self.cursors.append(self.sequence)
+
+    """
+    Publishes a notification from the author with id uid to its followers.
+    """
+
+    def publish(self, uid: int, notification):
+        followers = self.graph.followers[uid]
+        if len(followers) > self.pull_threshold:
+            with self._condition:
+                self.sequence += 1
+                history = self.pulled.setdefault(uid, [])
+                history.append((self.sequence, notification))
+                if len(history) > 2 * self.pull_history:
+                    del history[:-self.pull_history]
+            return
+        with self._condition:
+            self.sequence += 1
+        if self.deferred or Concurrency.enabled():
+            # The followers are copied so the delivery goes to the followers at publish time
+            followers = self.graph.followers_snapshot(uid)
+        if not self.deferred:
+            self._deliver(notification, followers, 0, len(followers))
+        else:
+            with self._condition:
+                self.pending.append([notification, followers, 0])
+                self._condition.notify()
+
+    """
+    Delivers up to max_batches batches of the queued notifications.
+    Returns the number of batches delivered.
+    """
+
+    def drain(self, max_batches: int = None) -> int:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with self._condition:
+                if not self.pending:
+                    break
+                delivery = self.pending[0]
+                notification, followers, start = delivery
+                end = min(start + self.batch_size, len(followers))
+                delivery[2] = end
+                if end == len(followers):
+                    self.pending.popleft()
+            self._deliver(notification, followers, start, end)
+            batches += 1
+        return batches
+
+    """
+    Delivers all the queued notifications.
+    """
+
+    def flush(self):
+        self.drain()
+
+    """
+    Returns True if there are queued notifications.
+    """
+
+    def has_pending(self) -> bool:
+        return bool(self.pending)
+
+    """
+    Moves the notifications of the pulled authors followed by the user with id uid
+    that were published since its last pull into its inbox, in publish order.
+    """
+
+    def pull(self, uid: int):
+        if not self.pulled:
+            return
+        with Concurrency.users.lock(uid), self._condition:
+            cursor = self.cursors[uid]
+            collected = []
+            for author in self.graph.following[uid]:
+                history = self.pulled.get(author)
+                if history:
+                    collected.extend(history[bisect_right(history, (cursor + 1, )):])
+            self.cursors[uid] = self.sequence
+        if collected:
+            collected.sort(key=lambda entry: entry[0])
+            notifications = self.graph.users[uid].notifications
+            for entry in collected:
+                notifications.append(entry[1])
+
+    """
+    Starts a background thread that delivers queued notifications as they are published.
+    """
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self.deferred = True
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name="fan-out", daemon=True)
+        self._worker.start()
+
+    """
+    Stops the background thread after it delivered all the queued notifications.
+    """
+
+    def stop(self):
+        if self._worker is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._worker.join()
+        self._worker = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self.pending:
+                    self._condition.wait()
+                if not self._running and not self.pending:
+                    return
+            self.drain(1)
+
+    def _deliver(self, notification, followers, start: int, end: int):
+        users = self.graph.users
+        for position in range(start, end, self.batch_size):
+            for uid in followers[position:min(position + self.batch_size, end)]:
+                users[uid].notifications.append(notification)
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+# A cache of decoded images shared by all the image posts.
+
+class ImageCache:
+    """
+    Size bounded LRU cache of decoded images.
+
+    Images are keyed by the hash of the file content, so identical files share one entry.
+    When the decoded images take more than max_bytes, the least recently used ones are evicted
+    and decoded again on their next access.
+    With a store, decoded images are persisted to it and the cache holds memory mapped views,
+    which don't count towards max_bytes since their pages belong to the OS page cache.
+    Every entry counts towards max_entries, so the number of open mappings stays bounded too.
+
+    Attributes:
+        max_bytes (int): The maximal number of bytes taken by the cached images.
+        max_entries (int): The maximal number of cached images.
+        size (int): The number of heap bytes taken by the cached images.
+        store (ImageStore): The optional store of decoded images, None to keep them in the heap.
+        entries (OrderedDict): (image, heap bytes) pairs keyed by content hash, least recently used first.
+        hashes (dict): The content hash of every file read, keyed by path, with the mtime and size it was computed for.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, store=None, max_entries: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.store = store
+        self.entries = OrderedDict()
+        self.hashes = dict()
+        self._lock = threading.Lock()
+
+    """
+    Returns the content hash of the file at path.
+    The hash is computed again only if the file was modified.
+    """
+
+    def key(self, path: str) -> str:
+        stat = os.stat(path)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        key = digest.hexdigest()
+        self.hashes[path] = (stat.st_mtime_ns, stat.st_size, key)
+        return key
+
+    """
+    Returns the decoded image of the file at path, decoding it on a cache miss.
+    """
+
+    def get(self, path: str):
+        key = self.key(path)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+        store = self.store
+        if store is not None:
+            image = store.get(key)
+            if image is None:
+                image = store.put(key, decode(path))
+            self.put(key, image, 0)
+            return image
+        image = decode(path)
+        self.put(key, image)
+        return image
+
+    """
+    Adds a decoded image under key and evicts least recently used images until the cache fits
+    max_bytes and max_entries.
+    nbytes is the heap size of the image (its size by default), an image bigger than max_bytes isn't cached.
+    """
+
+    def put(self, key: str, image, nbytes: int = None):
+        if nbytes is None:
+            nbytes = getattr(image, "nbytes", 0)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self.entries[key] = (image, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[1]
+
+    """
+    Removes all the cached images.
+    """
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+
+"""
+Decodes the image file at path into an array.
+matplotlib is imported here on first use, so importing the network doesn't load it.
+"""
+
+def decode(path: str):
+    import matplotlib.image as mpimg
+    return mpimg.imread(path)
+
+
+# The cache used by the image posts.
+image_cache = ImageCache()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+
+# Keeps decoded images on disk so they can be shared without copies.
+
+class ImageStore:
+    """
+    Persistent store of decoded images backed by memory mapped .npy files.
+
+    Every decoded image is written once to directory as <content hash>.npy and is then handed out as a
+    read only np.memmap, so the pixels live in the OS page cache instead of the Python heap.
+    Posts of the same file and processes using the same directory share the pages without copies,
+    and a restarted process reads the pixels back without decoding the image file again.
+
+    numpy is imported on first use, like matplotlib in the image posts.
+
+    Attributes:
+        directory (str): The directory holding the .npy files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    """
+    Returns the path of the .npy file of the image with the given content hash.
+    """
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npy")
+
+    """
+    Returns a read only memory mapped view of the stored image, or None if it isn't stored.
+    """
+
+    def get(self, key: str):
+        import numpy as np
+        try:
+            return np.load(self.path_for(key), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+
+    """
+    Stores a decoded image and returns a read only memory mapped view of it.
+    The file is written under a temporary name and renamed, so readers never see a partial file.
+    """
+
+    def put(self, key: str, image):
+        import numpy as np
+        descriptor, temporary = tempfile.mkstemp(suffix=".npy", dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, np.ascontiguousarray(image))
+            os.replace(temporary, self.path_for(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return self.get(key)
+
+    """
+    Returns True if the image with the given content hash is stored.
+    """
+
+    def __contains__(self, key: str):
+        return os.path.exists(self.path_for(key))
@@ -0,0 +1,342 @@
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+import EventSink
+from SocialNetwork import SocialNetwork
+from PostFactory import SalePost
+
+
+# Replays a log of actions (one JSON object per line) into a social network.
+#
+# Every line is an action with its fields, users are named by username and posts by their id
+# in the graph (0 for the first published post, 1 for the second...):
+#   {"action": "sign_up", "user": "Alice", "password": "pass1"}
+#   {"action": "log_in", "user": "Alice", "password": "pass1"}
+#   {"action": "log_out", "user": "Alice"}
+#   {"action": "follow", "user": "Alice", "target": "Bob"}
+#   {"action": "unfollow", "user": "Alice", "target": "Bob"}
+#   {"action": "publish", "user": "Alice", "type": "Text", "content": "Hello"}
+#   {"action": "publish", "user": "Alice", "type": "Image", "image": "image1.jpg"}
+#   {"action": "publish", "user": "Alice", "type": "Sale", "item": "Bike", "price": 300, "location": "Haifa"}
+#   {"action": "like", "user": "Bob", "post": 0}
+#   {"action": "comment", "user": "Bob", "post": 0, "text": "Nice"}
+#   {"action": "discount", "post": 2, "percent": 10, "password": "pass1"}
+#   {"action": "sold", "post": 2, "password": "pass1"}
+# A line that isn't such an object (unknown action, missing field, field of the wrong type) is counted as invalid.
+
+
+class IngestReport:
+    """
+    The counters of an ingestion.
+
+    Attributes:
+        applied (dict): The number of applied actions, keyed by action.
+        errors (dict): The number of rejected actions, keyed by action ('invalid' for unreadable lines).
+        samples (list): The first (line number, action, reason) of the rejected actions, at most max_samples.
+        max_samples (int): The maximal number of samples kept.
+        lines (int): The number of lines read.
+        elapsed (float): The duration of the ingestion in seconds.
+    """
+
+    def __init__(self, max_samples: int = 10):
+        self.applied = dict()
+        self.errors = dict()
+        self.samples = []
+        self.max_samples = max_samples
+        self.lines = 0
+        self.elapsed = 0.0
+
+    def add(self, action: str, count: int = 1):
+        self.applied[action] = self.applied.get(action, 0) + count
+
+    def fail(self, line: int, action: str, reason: str):
+        self.errors[action] = self.errors.get(action, 0) + 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append((line, action, reason))
+
+    """
+    Returns the number of actions read per second.
+    """
+
+    def throughput(self) -> float:
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        s = ("Ingested " + str(self.lines) + " actions in " + format(self.elapsed, ".2f") + "s ("
+             + format(self.throughput(), ".0f") + " actions/s)\n")
+        for action in sorted(set(self.applied) | set(self.errors)):
+            s += ("  " + action + ": " + str(self.applied.get(action, 0)) + " applied, "
+                  + str(self.errors.get(action, 0)) + " errors\n")
+        for line, action, reason in sorted(self.samples):
+            s += "  line " + str(line) + " (" + action + "): " + reason + "\n"
+        return s
+
+
+class Ingest:
+    """
+    Streams a log of actions into a social network.
+
+    The log is read through a pipeline of generators: chunks of chunk_size lines are parsed,
+    consecutive actions that have a bulk path (sign ups, follows, likes of the same post) are grouped,
+    and the groups are applied. Only one chunk is held at a time, so the memory doesn't depend
+    on the size of the log. A rejected action is counted and the ingestion goes on.
+
+    Attributes:
+        network (SocialNetwork): The network the actions are applied to.
+        chunk_size (int): The number of lines read at a time.
+        report (IngestReport): The counters of the ingestion.
+    """
+
+    # Actions applied in groups, the value tells which fields must be equal in a group
+    _BULK = {"sign_up": (), "follow": (), "like": ("post",)}
+
+    # The fields of every action with their types, publish also needs the fields of its post type
+    _FIELDS = {
+        "sign_up": (("user", str), ("password", str)),
+        "log_in": (("user", str), ("password", str)),
+        "log_out": (("user", str),),
+        "follow": (("user", str), ("target", str)),
+        "unfollow": (("user", str), ("target", str)),
+        "publish": (("user", str),),
+        "like": (("user", str), ("post", int)),
+        "comment": (("user", str), ("post", int), ("text", str)),
+        "discount": (("post", int), ("percent", (int, float)), ("password", str)),
+        "sold": (("post", int), ("password", str)),
+    }
+    _POST_FIELDS = {
+        "Text": (("content", str),),
+        "Image": (("image", str),),
+        "Sale": (("item", str), ("price", (int, float)), ("location", str)),
+    }
+
+    def __init__(self, network, chunk_size: int = 4096):
+        self.network = network
+        self.chunk_size = chunk_size
+        self.report = IngestReport()
+
+    """
+    Applies all the actions of the text file object file and returns the report.
+    The event messages of the actions are dropped unless echo is True.
+    """
+
+    def run(self, file, echo: bool = False) -> IngestReport:
+        sink = None if echo else EventSink.set_sink(EventSink.NullSink())
+        start = time.perf_counter()
+        try:
+            for group in self.groups(self.parse(self.chunks(file))):
+                self.apply(group)
+        finally:
+            self.report.elapsed = time.perf_counter() - start
+            if sink is not None:
+                EventSink.set_sink(sink)
+        return self.report
+
+    """
+    Yields lists of at most chunk_size lines of file.
+    """
+
+    def chunks(self, file):
+        while True:
+            chunk = list(islice(file, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    """
+    Yields a list of (line number, action) pairs for every chunk of lines.
+    Blank lines are skipped, unreadable or malformed ones are counted as 'invalid'.
+    """
+
+    def parse(self, chunks):
+        report = self.report
+        for chunk in chunks:
+            actions = []
+            for line in chunk:
+                report.lines += 1
+                if not line.strip():
+                    continue
+                try:
+                    action = json.loads(line)
+                except ValueError as error:
+                    report.fail(report.lines, "invalid", str(error))
+                    continue
+                reason = self._check(action)
+                if reason is not None:
+                    report.fail(report.lines, "invalid", reason)
+                    continue
+                actions.append((report.lines, action))
+            yield actions
+
+    """
+    Returns why the parsed line action isn't a valid action, None if it is valid.
+    A publish without type gets the type Text.
+    """
+
+    def _check(self, action) -> str:
+        if not isinstance(action, dict):
+            return "An action must be a JSON object"
+        name = action.get("action")
+        fields = self._FIELDS.get(name) if isinstance(name, str) else None
+        if fields is None:
+            return "Unknown action " + json.dumps(name)
+        if name == "publish":
+            post_type = action.setdefault("type", "Text")
+            post_fields = self._POST_FIELDS.get(post_type) if isinstance(post_type, str) else None
+            if post_fields is None:
+                return "Unknown post type " + json.dumps(post_type)
+            fields += post_fields
+        for field, kind in fields:
+            value = action.get(field)
+            # JSON true and false are read as bools, which are ints for isinstance
+            if not isinstance(value, kind) or isinstance(value, bool):
+                return "Missing or invalid field " + field + " of " + name
+        return None
+
+    """
+    Yields groups of (line number, action) pairs to apply together, in log order.
+    A group holds consecutive actions of the same chunk with a bulk path, any other action is alone.
+    """
+
+    def groups(self, chunks):
+        for actions in chunks:
+            group = []
+            key = None
+            for entry in actions:
+                action = entry[1]
+                fields = self._BULK.get(action["action"])
+                entry_key = None if fields is None else (action["action"],) + tuple(action.get(f) for f in fields)
+                if group and (entry_key is None or entry_key != key):
+                    yield group
+                    group = []
+                group.append(entry)
+                key = entry_key
+            if group:
+                yield group
+
+    """
+    Applies a group of actions.
+    """
+
+    def apply(self, group):
+        name = group[0][1]["action"]
+        if len(group) > 1:
+            getattr(self, "_bulk_" + name)(group)
+            return
+        line, action = group[0]
+        try:
+            getattr(self, "_" + name)(action)
+        except Exception as error:
+            self.report.fail(line, name, str(error) or type(error).__name__)
+        else:
+            self.report.add(name)
+
+    def _user(self, username: str):
+        user = self.network.registry.get(username)
+        if user is None:
+            raise Exception("User " + str(username) + " not found")
+        return user
+
+    def _post(self, post_id):
+        posts = self.network.graph.posts
+        if not isinstance(post_id, int) or not 0 <= post_id < len(posts):
+            raise Exception("Post " + str(post_id) + " not found")
+        return posts[post_id]
+
+    def _sale(self, post_id):
+        post = self._post(post_id)
+        if not isinstance(post, SalePost):
+            raise Exception("Post " + str(post_id) + " isn't a sale post")
+        return post
+
+    def _sign_up(self, action):
+        self.network.sign_up(action["user"], action["password"])
+
+    def _log_in(self, action):
+        self.network.log_in(action["user"], action["password"])
+
+    def _log_out(self, action):
+        self.network.log_out(action["user"])
+
+    def _follow(self, action):
+        self._user(action["user"]).follow(self._user(action["target"]))
+
+    def _unfollow(self, action):
+        self._user(action["user"]).unfollow(self._user(action["target"]))
+
+    def _publish(self, action):
+        user = self._user(action["user"])
+        post_type = action["type"]
+        user.publish_post(post_type, *(action[field] for field, _ in self._POST_FIELDS[post_type]))
+
+    def _like(self, action):
+        self._post(action["post"]).like(self._user(action["user"]))
+
+    def _comment(self, action):
+        self._post(action["post"]).comment(self._user(action["user"]), action["text"])
+
+    def _discount(self, action):
+        self._sale(action["post"]).discount(action["percent"], action["password"])
+
+    def _sold(self, action):
+        if not self._sale(action["post"]).sold(action["password"]):
+            raise Exception("password isn't correct")
+
+    def _bulk_sign_up(self, group):
+        lines = [line for line, _ in group]
+        result = self.network.bulk_sign_up((action["user"], action["password"]) for _, action in group)
+        self._count("sign_up", result, lines)
+
+    def _bulk_follow(self, group):
+        lines = [line for line, _ in group]
+        result = self.network.bulk_follow((action["user"], action["target"]) for _, action in group)
+        self._count("follow", result, lines)
+
+    def _bulk_like(self, group):
+        lines = []
+        users = []
+        try:
+            post = self._post(group[0][1]["post"])
+        except Exception as error:
+            for line, _ in group:
+                self.report.fail(line, "like", str(error))
+            return
+        for line, action in group:
+            user = self.network.registry.get(action["user"])
+            if user is None:
+                self.report.fail(line, "like", "User " + action["user"] + " not found")
+            else:
+                lines.append(line)
+                users.append(user)
+        self._count("like", post.bulk_like(users), lines)
+
+    def _count(self, name: str, result, lines: list):
+        for index, _, reason in result.failures:
+            self.report.fail(lines[index], name, reason)
+        self.report.add(name, len(result.done))
+
+
+"""
+Command line entry point: ingest <events.jsonl or - for the standard input> [options].
+"""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py ingest", description="Replays a JSON lines action log.")
+    parser.add_argument("path", help="the action log, - for the standard input")
+    parser.add_argument("--name", default="Twitter", help="the name of the social network")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="the number of lines read at a time")
+    parser.add_argument("--echo", action="store_true", help="print the event messages of the actions")
+    parser.add_argument("--save", help="save a snapshot of the network to this path at the end")
+    args = parser.parse_args(argv)
+    network = SocialNetwork(args.name)
+    ingest = Ingest(network, args.chunk_size)
+    if args.path == "-":
+        report = ingest.run(sys.stdin, args.echo)
+    else:
+        with open(args.path, encoding="utf-8") as file:
+            report = ingest.run(file, args.echo)
+    if args.save:
+        network.save(args.save)
+    print(report, end="")
+    return report
@@ -0,0 +1,147 @@
+# Ranks keys (post ids, user ids...) by a count that changes one at a time.
+
+class Bucket:
+    """
+    The keys of a leaderboard having the same count, linked to the buckets of the next counts.
+
+    Attributes:
+        count (int): The count of the keys.
+        keys (dict): The keys of the bucket, in the order they reached the count (values are unused).
+        higher (Bucket): The bucket of the next higher count, None for the highest one.
+        lower (Bucket): The bucket of the next lower count, None for the lowest one.
+    """
+
+    __slots__ = ("count", "keys", "higher", "lower")
+
+    def __init__(self, count: int, higher=None, lower=None):
+        self.count = count
+        self.keys = dict()
+        self.higher = higher
+        self.lower = lower
+
+
+class Leaderboard:
+    """
+    Keys ranked by their count, for counts changed by one (a like, a follow...).
+
+    The keys of a count share a bucket and the non-empty buckets form a doubly linked list
+    sorted by count, so moving a key to count + 1 or count - 1 only touches the neighbor bucket (O(1)),
+    and the top k keys are read from the highest bucket down (O(k)).
+    Keys with a count of 0 aren't kept.
+
+    Attributes:
+        highest (Bucket): The bucket of the highest count, None if the leaderboard is empty.
+        lowest (Bucket): The bucket of the lowest count, None if the leaderboard is empty.
+    """
+
+    def __init__(self):
+        self.highest = None
+        self.lowest = None
+        self._buckets = dict()
+
+    """
+    Adds one to the count of key.
+    """
+
+    def increment(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            target = self.lowest
+            if target is None or target.count != 1:
+                target = self._link(1, lower=None, higher=self.lowest)
+        else:
+            target = bucket.higher
+            if target is None or target.count != bucket.count + 1:
+                target = self._link(bucket.count + 1, lower=bucket, higher=bucket.higher)
+            self._unlink(bucket, key)
+        target.keys[key] = None
+        self._buckets[key] = target
+
+    """
+    Removes one from the count of key, the key is dropped when its count reaches 0.
+    """
+
+    def decrement(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        if bucket.count == 1:
+            del self._buckets[key]
+            self._unlink(bucket, key)
+            return
+        target = bucket.lower
+        if target is None or target.count != bucket.count - 1:
+            target = self._link(bucket.count - 1, lower=bucket.lower, higher=bucket)
+        self._unlink(bucket, key)
+        target.keys[key] = None
+        self._buckets[key] = target
+
+    """
+    Returns the count of key.
+    """
+
+    def count(self, key) -> int:
+        bucket = self._buckets.get(key)
+        return 0 if bucket is None else bucket.count
+
+    """
+    Returns the k keys with the highest counts as (key, count) pairs, highest first.
+    Keys of the same count are given in the order they reached it.
+    """
+
+    def top(self, k: int = 10) -> list:
+        result = []
+        bucket = self.highest
+        while bucket is not None and len(result) < k:
+            for key in bucket.keys:
+                result.append((key, bucket.count))
+                if len(result) == k:
+                    break
+            bucket = bucket.lower
+        return result
+
+    """
+    Replaces the content of the leaderboard by the given (key, count) pairs.
+    """
+
+    def load(self, counts):
+        self.highest = None
+        self.lowest = None
+        self._buckets = dict()
+        grouped = dict()
+        for key, count in counts:
+            if count > 0:
+                grouped.setdefault(count, []).append(key)
+        for count in sorted(grouped):
+            bucket = self._link(count, lower=self.highest, higher=None)
+            for key in grouped[count]:
+                bucket.keys[key] = None
+                self._buckets[key] = bucket
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _link(self, count: int, lower, higher) -> Bucket:
+        bucket = Bucket(count, higher, lower)
+        if lower is None:
+            self.lowest = bucket
+        else:
+            lower.higher = bucket
+        if higher is None:
+            self.highest = bucket
+        else:
+            higher.lower = bucket
+        return bucket
+
+    def _unlink(self, bucket: Bucket, key):
+        del bucket.keys[key]
+        if bucket.keys:
+            return
+        if bucket.lower is None:
+            self.lowest = bucket.higher
+        else:
+            bucket.lower.higher = bucket.higher
+        if bucket.higher is None:
+            self.highest = bucket.lower
+        else:
+            bucket.higher.lower = bucket.lower
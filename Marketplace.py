@@ -0,0 +1,159 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from PostFactory import SalePost
+
+
+# Finds the sale posts of a network by keywords, price and pickup location.
+
+_TOKEN = re.compile(r"\w+")
+
+"""
+Returns the lowercase words of text.
+"""
+
+def tokenize(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+class Marketplace:
+    """
+    Indexes of the sale posts of a graph, kept up to date by listening to it.
+
+    The ids of the sale posts are indexed by every word of their item (an inverted index),
+    by their location (lowercase) and by their price, kept sorted for range queries.
+    The ids of the available posts are kept in a set.
+    A search intersects the matching index entries starting from the smallest one
+    (or walks the price range when it is smaller), so it costs about the size of that entry
+    instead of the number of posts.
+
+    Attributes:
+        graph (SocialGraph): The graph of the indexed posts.
+        tokens (dict): The ids of the posts having a word in their item, keyed by the word.
+        locations (dict): The ids of the posts of a pickup location, keyed by the lowercase location.
+        prices (list): The indexed prices, sorted.
+        price_ids (list): The ids of the posts of prices, in the same order.
+        available (set): The ids of the available posts.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.tokens = dict()
+        self.locations = dict()
+        self.prices = []
+        self.price_ids = []
+        self.available = set()
+        self._price_of = dict()
+        self._lock = threading.RLock()
+
+    """
+    Indexes again all the sale posts of the graph, e.g. after they were loaded without events.
+    """
+
+    def rebuild(self):
+        with self._lock:
+            self.tokens.clear()
+            self.locations.clear()
+            self.prices = []
+            self.price_ids = []
+            self.available.clear()
+            self._price_of.clear()
+            for post in self.graph.posts:
+                if isinstance(post, SalePost):
+                    self._add(post)
+
+    """
+    Returns the sale posts matching all the given filters, cheapest first.
+
+    Args:
+        query (str): Words that must all appear in the item, e.g. 'toyota prius'.
+        min_price: The minimal price (included).
+        max_price: The maximal price (included).
+        location (str): The pickup location, case insensitive.
+        available (bool): True for available posts only, False for sold ones only, None for both.
+        limit (int): The maximal number of posts returned, None for all of them.
+    """
+
+    def search(self, query: str = None, min_price=None, max_price=None, location: str = None,
+               available: bool = True, limit: int = None) -> list:
+        if limit is not None and limit <= 0:
+            return []
+        with self._lock:
+            sets = []
+            if query is not None:
+                for token in set(tokenize(query)):
+                    ids = self.tokens.get(token)
+                    if not ids:
+                        return []
+                    sets.append(ids)
+            if location is not None:
+                ids = self.locations.get(location.lower())
+                if not ids:
+                    return []
+                sets.append(ids)
+            if available:
+                sets.append(self.available)
+            low = 0 if min_price is None else bisect_left(self.prices, min_price)
+            high = len(self.prices) if max_price is None else bisect_right(self.prices, max_price)
+            if high <= low:
+                return []
+            sets.sort(key=len)
+            price_of = self._price_of
+            if not sets or high - low < len(sets[0]):
+                result = [post_id for post_id in self.price_ids[low:high] if all(post_id in ids for ids in sets)]
+            else:
+                result = sets[0].intersection(*sets[1:])
+                if low > 0 or high < len(self.prices):
+                    result = [post_id for post_id in result
+                              if (min_price is None or price_of[post_id] >= min_price)
+                              and (max_price is None or price_of[post_id] <= max_price)]
+                else:
+                    result = list(result)
+            if available is False:
+                result = [post_id for post_id in result if post_id not in self.available]
+            result.sort(key=price_of.__getitem__)
+            if limit is not None:
+                result = result[:limit]
+            posts = self.graph.posts
+            return [posts[post_id] for post_id in result]
+
+    def on_publish(self, user, post):
+        if isinstance(post, SalePost):
+            with self._lock:
+                self._add(post)
+
+    def on_discount(self, post, dis):
+        with self._lock:
+            self._remove_price(post.post_id)
+            self._add_price(post)
+
+    def on_sold(self, post):
+        with self._lock:
+            self.available.discard(post.post_id)
+
+    def on_available(self, post):
+        with self._lock:
+            self.available.add(post.post_id)
+
+    def _add(self, post):
+        post_id = post.post_id
+        for token in set(tokenize(post.item)):
+            self.tokens.setdefault(token, set()).add(post_id)
+        self.locations.setdefault(post.location.lower(), set()).add(post_id)
+        self._add_price(post)
+        if post.available:
+            self.available.add(post_id)
+
+    def _add_price(self, post):
+        index = bisect_right(self.prices, post.price)
+        self.prices.insert(index, post.price)
+        self.price_ids.insert(index, post.post_id)
+        self._price_of[post.post_id] = post.price
+
+    def _remove_price(self, post_id: int):
+        price = self._price_of.pop(post_id)
+        index = bisect_left(self.prices, price)
+        while self.price_ids[index] != post_id:
+            index += 1
+        del self.prices[index]
+        del self.price_ids[index]
@@ -0,0 +1,164 @@
+import time
+import Concurrency
+
+
+# An event shown in the notifications of users.
+
+class Notification:
+    """
+    An immutable notification event.
+
+    One record is created per event and shared by reference by every inbox receiving it,
+    the text is only rendered when the notification is printed.
+
+    Attributes:
+        kind (str): The kind of the event (NEW_POST, LIKE or COMMENT).
+        actor (User): The user who caused the event.
+        post: The post the event is about.
+        timestamp (float): The time of the event in seconds since the epoch.
+    """
+
+    NEW_POST = "new post"
+    LIKE = "like"
+    COMMENT = "comment"
+
+    _templates = {
+        NEW_POST: "{} has a new post",
+        LIKE: "{} liked your post",
+        COMMENT: "{} commented on your post",
+    }
+
+    __slots__ = ("kind", "actor", "post", "timestamp")
+
+    def __init__(self, kind: str, actor, post=None, timestamp: float = None):
+        object.__setattr__(self, "kind", kind)
+        object.__setattr__(self, "actor", actor)
+        object.__setattr__(self, "post", post)
+        object.__setattr__(self, "timestamp", time.time() if timestamp is None else timestamp)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Notification is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Notification is immutable")
+
+    """
+    Returns the text of the notification.
+    """
+
+    def render(self) -> str:
+        return self._templates[self.kind].format(self.actor.username)
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return "Notification(" + self.kind + ", " + self.actor.username + ")"
+
+
+# The notifications received by a user.
+
+class Inbox:
+    """
+    A bounded inbox of notifications kept in a ring buffer.
+
+    Every notification gets a sequence number, its position in the whole history of the inbox
+    (the first one is 1). Only the latest capacity notifications are kept, older ones are evicted.
+    The sequence numbers are used as cursors for pagination and for tracking the read notifications,
+    so reading a page costs the size of the page no matter how long the history is.
+
+    Attributes:
+        capacity (int): The maximal number of notifications kept.
+        total (int): The number of notifications ever added, which is the sequence of the newest one.
+        read (int): The sequence of the last read notification.
+    """
+
+    DEFAULT_CAPACITY = 1000
+
+    def __init__(self, capacity: int = None):
+        self.capacity = capacity if capacity is not None else Inbox.DEFAULT_CAPACITY
+        if self.capacity <= 0:
+            raise Exception("Inbox capacity should be positive")
+        self.total = 0
+        self.read = 0
+        self._items = []
+
+    """
+    Adds a notification, evicting the oldest one if the inbox is full.
+    """
+
+    def append(self, notification: Notification):
+        with Concurrency.inboxes.lock(id(self)):
+            if len(self._items) < self.capacity:
+                self._items.append(notification)
+            else:
+                self._items[self.total % self.capacity] = notification
+            self.total += 1
+
+    """
+    Returns the sequence of the oldest notification kept.
+    """
+
+    def oldest(self) -> int:
+        return self.total - len(self._items) + 1
+
+    """
+    Returns a page of at most limit (sequence, notification) pairs in the order they were received.
+    With after=None the latest page is returned, otherwise the notifications following the sequence after.
+    """
+
+    def get_notifications(self, after: int = None, limit: int = 20) -> list:
+        if after is None:
+            start = max(self.oldest(), self.total - limit + 1)
+        else:
+            start = max(self.oldest(), after + 1)
+        end = min(self.total, start + limit - 1)
+        items = self._items
+        capacity = self.capacity
+        return [(sequence, items[(sequence - 1) % capacity]) for sequence in range(start, end + 1)]
+
+    """
+    Returns the number of unread notifications that are still kept.
+    """
+
+    def unread_count(self) -> int:
+        return self.total - max(self.read, self.oldest() - 1)
+
+    """
+    Returns a page of the unread notifications, oldest first.
+    """
+
+    def get_unread(self, limit: int = 20) -> list:
+        return self.get_notifications(self.read, limit)
+
+    """
+    Marks the notifications up to the given sequence (all of them by default) as read.
+    """
+
+    def mark_read(self, sequence: int = None):
+        if sequence is None or sequence > self.total:
+            sequence = self.total
+        self.read = max(self.read, sequence)
+
+    """
+    Replaces the content of the inbox by the given notifications, oldest first,
+    the newest one having the sequence total.
+    """
+
+    def restore(self, notifications, total: int, read: int):
+        kept = list(notifications)[-self.capacity:]
+        self._items = [None] * len(kept)
+        oldest = total - len(kept) + 1
+        for offset, notification in enumerate(kept):
+            self._items[(oldest + offset - 1) % self.capacity] = notification
+        self.total = total
+        self.read = read
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        items = self._items
+        capacity = self.capacity
+        for sequence in range(self.oldest(), self.total + 1):
+            yield items[(sequence - 1) % capacity]
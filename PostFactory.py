@@ -1,58 +1,129 @@
-from matplotlib import pyplot as plt
-import matplotlib.image as mpimg
-from Exceptions import NotOnlineNotificationError
+import os
+from array import array
+from bisect import bisect_left
+from Exceptions import ensure_can_like, ensure_can_comment, NotOnlineNotificationError
+from Notification import Notification
+from BulkResult import BulkResult
+from CommentThread import CommentThread
+from ImageCache import image_cache
+import EventSink
+import Concurrency
 import User
 
 class Like:
     """
     Represents a like action on a post.
 
+    Posts don't keep Like objects, they keep the ids of the users who liked them,
+    and the notification of a like is sent by notify_author without creating a Like.
+
     Attributes:
         user: The user who liked the post.
         author: The author of the post.
+        post: The liked post.
     """
-    def __init__(self, user: User, author: User):
+
+    __slots__ = ("user", "author", "post")
+
+    def __init__(self, user: User, author: User, post=None):
         self.user = user
         self.author = author
+        self.post = post
     """
     adds the notification to the author notifications list
-    Prints a notification to the post author when a user likes their post.
+    Sends a notification event (printed by default) to the post author when a user likes their post.
     
     NOTE: the author can like the post but does not have notification about it. 
     """
     def printnotification(self, user):
-        if user.username != self.author.username:
-            self.author.add_notification(user.username + " liked your post")
-            print("notification to " + self.author.username + ": " + user.username + " liked your post")
+        Like.notify_author(user, self.author, self.post)
+
+    """
+    Sends the notification of a like of user on post to author.
+    """
+
+    @staticmethod
+    def notify_author(user: User, author: User, post):
+        if user.username != author.username:
+            author.add_notification(Notification(Notification.LIKE, user, post))
+            EventSink.emit("like", "notification to " + author.username + ": " + user.username + " liked your post",
+                           user=user.username, author=author.username)
 
 
 class Comment:
     """
        Represents a comment action on a post.
 
+       The notification of a comment is sent by notify_author without creating a Comment.
+
        Attributes:
            user: The user who commented on the post.
            text: The comment text.
            author: The author of the post.
+           post: The commented post.
+           timestamp (float): The time of the comment, None if unknown.
 
        """
 
-    def __init__(self, user: User, text: str, author: User):
+    __slots__ = ("text", "user", "author", "post", "timestamp")
+
+    def __init__(self, user: User, text: str, author: User, post=None, timestamp: float = None):
         self.text = text
         self.user = user
         self.author = author
+        self.post = post
+        self.timestamp = timestamp
 
     """
     adds the notification to the author notifications list
-    Prints a notification to the post author when a user comments on their post.
+    Sends a notification event (printed by default) to the post author when a user comments on their post.
     
     NOTE: the author can comment on the post but does not have notification about it. 
     """
 
     def printnotification(self, user: User, text: str):
-        if user.username != self.author.username:
-            self.author.add_notification(user.username + " commented on your post")
-            print("notification to " + self.author.username + ": " + user.username + " commented on your post: " + text)
+        Comment.notify_author(user, text, self.author, self.post)
+
+    """
+    Sends the notification of a comment of user on post to author.
+    """
+
+    @staticmethod
+    def notify_author(user: User, text: str, author: User, post):
+        if user.username != author.username:
+            author.add_notification(Notification(Notification.COMMENT, user, post))
+            EventSink.emit("comment", "notification to " + author.username + ": " + user.username
+                           + " commented on your post: " + text,
+                           user=user.username, author=author.username, comment=text)
+
+
+class LikesView:
+    """
+    A read only set-like view of the users who liked a post, read from the ids kept by the post.
+
+    Attributes:
+        post (Post): The liked post.
+    """
+
+    __slots__ = ("post",)
+
+    def __init__(self, post):
+        self.post = post
+
+    def __len__(self):
+        post = self.post
+        return len(post._likers) + len(post._pending or ())
+
+    def __iter__(self):
+        users = self.post.author.graph.users
+        for uid in self.post.likers:
+            yield users[uid]
+
+    def __contains__(self, user):
+        post = self.post
+        if getattr(user, "graph", None) is not post.author.graph:
+            return False
+        return post._has_liker(user.uid)
 
 
 class PostFactory:
@@ -80,115 +151,261 @@ class PostFactory:
             return SalePost(*args, **kwargs)
 
 
-class TextPost(Like, Comment):
-
+class Post:
     """
-    Represents a text post in the social network.
+    Base class of the posts, holding the likes and comments shared by all the post types.
 
-    Inherits from:
-        Like: Allows users to like text posts.
-        Comment: Allows users to comment on text posts.
+    The likes are kept as a sorted array of the ids of the users who liked the post (4 bytes per like),
+    likes gives them as users.
+    Inserting in the middle of a big sorted array moves all the ids after it, so a new like goes
+    to a small set of pending ids first; the set is merged into the array in one sort once it holds
+    more than an eighth of the array (and at least MERGE_MIN ids), or when likers is read.
+    A like then costs a binary search and a set insertion, plus an amortized share of the merges,
+    for at most an eighth more memory (the pending ids) than the array alone.
 
     Attributes:
         author (User): The author of the post.
-        content (str): The content of the text post.
-        likes (set): Set of users who liked the post.
-        comments (dict): Dictionary of comments on the post.
+        likes (LikesView): The users who liked the post.
+        likers (array): The sorted ids of the users who liked the post, pending ids merged in.
+        comments (CommentThread): The comments on the post, in the order they were written.
+        post_id (int): The id of the post in the graph of its author, set when the post is published.
+        timestamp (float): The publish time of the post.
     """
-    def __init__(self, content: str, author: User):
-        # self.text = "Text"
+
+    __slots__ = ("author", "_likers", "_pending", "comments", "post_id", "timestamp", "_rendered")
+
+    # The number of pending likes always allowed before a merge
+    MERGE_MIN = 256
+
+    def __init__(self, author: User):
         self.author = author
-        self.content = content
-        self.likes = set()
-        self.comments = dict()
+        self._likers = array('i')
+        self._pending = None
+        self.comments = CommentThread(self)
+        self.post_id = None
+        self.timestamp = None
+        self._rendered = None
 
     """
-    Allows users to like text posts.
+    Allows users to like the post.
       Raises:
-          NotOnlineNotificationError: If users try to give likes while they are not online.
+          NotOnlineNotificationError: If users try to give likes while they are not online
+                                      or belong to another network.
     """
     def like(self, user: User):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantLike()
-        self.likes.add(user)
-        l = Like(user, self.author)
-        l.printnotification(user)
+        with Concurrency.users.lock(user.uid), Concurrency.posts.lock(self.post_id):
+            ensure_can_like(user, self)
+            self._add_liker(user.uid)
+            Like.notify_author(user, self.author, self)
+            self._emit("on_like", user)
 
     """
-    Allows users to comment text posts.
+    Allows users to comment the post, every comment is kept (a user can comment several times).
       Raises:
-          NotOnlineNotificationError: If users try to comment while they are not online.
+          NotOnlineNotificationError: If users try to comment while they are not online
+                                      or belong to another network.
     """
 
     def comment(self, user: User, text: str):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantComment()
-        self.comments.update({user.username: text})
-        c = Comment(user, text, self.author)
-        c.printnotification(user, text)
+        with Concurrency.users.lock(user.uid), Concurrency.posts.lock(self.post_id):
+            ensure_can_comment(user, self)
+            self.comments.append(user, text)
+            Comment.notify_author(user, text, self.author, self)
+            self._emit("on_comment", user, text)
 
     """
-    A unique notification related to this post type.
-    Uses: helps to print a global notification in the network
+    Likes the post by many users at once, e.g. when importing data.
+    Every user is checked like in like() and its like is applied under its user lock and the post lock,
+    the author gets the like notifications in its inbox but no event message is sent.
+
+    Returns:
+        BulkResult: The users whose like was applied and the rejected ones with the reason.
     """
 
-    def notification(self):
-        return (" published a post:\n"
-                + "\"" +self.content+"\"")
+    def bulk_like(self, users) -> BulkResult:
+        result = BulkResult()
+        author = self.author
+        notifications = author.notifications
+        post_lock = Concurrency.posts.lock(self.post_id)
+        for index, user in enumerate(users):
+            with Concurrency.users.lock(user.uid), post_lock:
+                try:
+                    ensure_can_like(user, self)
+                except NotOnlineNotificationError as error:
+                    result.fail(index, user, str(error))
+                    continue
+                # Goes through the pending likes, so a few likes don't cost a pass over all the likers
+                self._add_liker(user.uid)
+                if user.username != author.username:
+                    notifications.append(Notification(Notification.LIKE, user, self))
+                self._emit("on_like", user)
+            result.add(user)
+        return result
+
+    """
+    Returns a page of at most limit (sequence, Comment) pairs of the post, oldest first.
+    With after=None the page starts at the first comment, otherwise after the comment with the sequence after.
+    """
+
+    def get_comments(self, after: int = None, limit: int = 20) -> list:
+        return self.comments.get_comments(after, limit)
+
+    """
+    The users who liked the post.
+    """
+
+    @property
+    def likes(self):
+        return LikesView(self)
+
+    """
+    The sorted ids of the users who liked the post.
+    """
+
+    @property
+    def likers(self) -> array:
+        if self._pending:
+            self._merge()
+        return self._likers
+
+    @likers.setter
+    def likers(self, likers: array):
+        self._likers = likers
+        self._pending = None
+
+    """
+    Returns the ids of the likers without merging the pending ones, which come last and unsorted.
+    Unlike likers it doesn't take the lock of the post, so it can be read while other locks are held.
+    """
+
+    def liker_ids(self) -> array:
+        pending = self._pending
+        return self._likers + array('i', pending) if pending else self._likers
+
+    """
+    Sends event about the post to the listeners of the graph of its author.
+    A post that wasn't published has no id to be referred to, so its changes aren't sent.
+    """
+
+    def _emit(self, event: str, *args):
+        if self.post_id is not None:
+            self.author.graph.emit(event, self, *args)
+
+    """
+    Returns True if the user with id uid liked the post.
+    """
+
+    def _has_liker(self, uid: int) -> bool:
+        likers = self._likers
+        index = bisect_left(likers, uid)
+        if index < len(likers) and likers[index] == uid:
+            return True
+        pending = self._pending
+        return pending is not None and uid in pending
 
     """
-    Method for printing the TextPost object
+    Adds uid to the likers, returns False if it is already there.
     """
+
+    def _add_liker(self, uid: int) -> bool:
+        if self._has_liker(uid):
+            return False
+        pending = self._pending
+        if pending is None:
+            pending = self._pending = set()
+        pending.add(uid)
+        if len(pending) > self.MERGE_MIN and len(pending) > len(self._likers) >> 3:
+            self._merge()
+        return True
+
+    """
+    Merges the pending ids into the sorted likers.
+    """
+
+    def _merge(self):
+        with Concurrency.posts.lock(self.post_id):
+            pending = self._pending
+            if pending:
+                # A sorted run followed by the pending ids, which sorted merges in linear time.
+                # The new array replaces the old one, so readers never see a half sorted array.
+                self._likers = array('i', sorted(self._likers + array('i', pending)))
+                self._pending = None
+
+    """
+    Method for printing the post.
+    The text is rendered once and cached, posts changing their text drop it with _invalidate.
+    """
+
     def __str__(self):
-        return self.author.username + self.notification()+"\n"
+        rendered = self._rendered
+        if rendered is None:
+            rendered = self._rendered = self.author.username + self.notification() + "\n"
+        return rendered
+
+    def _invalidate(self):
+        self._rendered = None
 
 
-class ImagePost(Like, Comment):
+class TextPost(Post):
+
     """
-    Represents an image post in the social network.
+    Represents a text post in the social network.
 
     Inherits from:
-        Like: Allows users to like image posts.
-        Comment: Allows users to comment on image posts.
+        Post: Allows users to like and comment text posts.
 
     Attributes:
         author (User): The author of the post.
-        image (str): The image file path.
-        likes (set): Set of users who liked the post.
-        comments (dict): Dictionary of comments on the post.
+        content (str): The content of the text post.
+        likes (LikesView): The users who liked the post.
+        comments (CommentThread): The comments on the post, in the order they were written.
+        post_id (int): The id of the post in the graph of its author, set when the post is published.
+        timestamp (float): The publish time of the post.
     """
 
-    def __init__(self,image: str, author: User):
-        # self.post_type = "image"
-        self.author = author
-        self.image = mpimg.imread(image)
-        self.likes = set()
-        self.comments = dict()
+    __slots__ = ("content",)
+
+    def __init__(self, content: str, author: User):
+        # self.text = "Text"
+        super().__init__(author)
+        self.content = content
 
     """
-    Allows users to like image posts.
-      Raises:
-          NotOnlineNotificationError: If users try to give likes while they are not online.
+    A unique notification related to this post type.
+    Uses: helps to print a global notification in the network
     """
-    def like(self, user: User):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantLike()
-        self.likes.add(user)
-        l = Like(user, self.author)
-        l.printnotification(user)
 
+    def notification(self):
+        return (" published a post:\n"
+                + "\"" +self.content+"\"")
+
+
+
+class ImagePost(Post):
     """
-    Allows users to comment image posts.
-      Raises:
-          NotOnlineNotificationError: If users try to comment while they are not online.
+    Represents an image post in the social network.
+
+    Inherits from:
+        Post: Allows users to like and comment image posts.
+
+    Attributes:
+        author (User): The author of the post.
+        path (str): The image file path.
+        image (array): The decoded image, read lazily through the shared image cache
+                       (a read only memory mapped view when the cache has an image store).
+        likes (LikesView): The users who liked the post.
+        comments (CommentThread): The comments on the post, in the order they were written.
+        post_id (int): The id of the post in the graph of its author, set when the post is published.
+        timestamp (float): The publish time of the post.
     """
 
-    def comment(self, user: User, text: str):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantComment()
-        self.comments.update({user.username: text})
-        c = Comment(user, text, self.author)
-        c.printnotification(user, text)
+    __slots__ = ("path",)
+
+    def __init__(self,image: str, author: User):
+        # self.post_type = "image"
+        super().__init__(author)
+        os.stat(image)  # fails early if the image file is missing
+        self.path = image
 
     """
     A unique notification related to this post type.
@@ -198,29 +415,43 @@ class ImagePost(Like, Comment):
         return " posted a picture"
 
     """
-    Method for displaying the image in the image post.
+    The decoded image, decoded on first access and shared with other posts of the same file.
+    """
+    @property
+    def image(self):
+        return image_cache.get(self.path)
+
     """
-    def display(self):
+    Method for displaying the image in the image post.
+    matplotlib is imported on first use, so the rest of the network never loads it.
+    Args:
+        target: A file path or a binary file object, when given the picture is rendered into it
+                without loading pyplot (headless mode) and target is returned.
+        format (str): The image format used when rendering to target, e.g. 'png'.
+    """
+    def display(self, target=None, format: str = None):
+        if target is not None:
+            from matplotlib.figure import Figure
+            figure = Figure()
+            axes = figure.add_subplot()
+            axes.imshow(self.image)
+            axes.axis('off')  # Turn off axis
+            figure.savefig(target, format=format)
+            return target
+        from matplotlib import pyplot as plt
         plt.imshow(self.image)
         plt.axis('off')  # Turn off axis
         print("Shows picture")
         plt.show()
 
-    """
-    Method for printing the ImagePost object
-    """
-
-    def __str__(self):
-        return self.author.username + self.notification()+"\n"
 
 
-class SalePost(Like, Comment):
+class SalePost(Post):
     """
     Represents a sale post in the social network.
 
     Inherits from:
-        Like: Allows users to like sale posts.
-        Comment: Allows users to comment on sale posts.
+        Post: Allows users to like and comment sale posts.
 
     Attributes:
         item (str): The item for sale.
@@ -228,42 +459,20 @@ class SalePost(Like, Comment):
         author (User): The author of the post.
         location (str): The pickup location for the item.
         available (bool): Indicates whether the item is available for sale.
-        likes (set): Set of users who liked the post.
-        comments (dict): Dictionary of comments on the post.
+        likes (LikesView): The users who liked the post.
+        comments (CommentThread): The comments on the post, in the order they were written.
+        post_id (int): The id of the post in the graph of its author, set when the post is published.
+        timestamp (float): The publish time of the post.
     """
 
+    __slots__ = ("item", "price", "location", "available")
+
     def __init__(self, item: str, price, location: str, author: User):
+        super().__init__(author)
         self.item = item
         self.price = price
-        self.author = author
         self.location = location
         self.available = True
-        self.likes = set()
-        self.comments = dict()
-
-    """
-    Allows users to like sale posts.
-      Raises:
-          NotOnlineNotificationError: If users try to give likes while they are not online.
-    """
-    def like(self, user: User):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantLike()
-        self.likes.add(user)
-        l = Like(user, self.author)
-        l.printnotification(user)
-
-    """
-    Allows users to comment sale posts.
-      Raises:
-          NotOnlineNotificationError: If users try to comment while they are not online.
-    """
-    def comment(self, user: User, text: str):
-        exception = NotOnlineNotificationError(user, self)
-        exception.cantComment()
-        self.comments.update({user.username: text})
-        c = Comment(user, text, self.author)
-        c.printnotification(user, text)
 
     """
     A unique notification related to this post type.
@@ -279,14 +488,22 @@ class SalePost(Like, Comment):
 
     """
     Marks the item as sold and notifies other users.
+    With a wrong password the item is put back on sale and False is returned.
     """
     def sold(self, password: str):
         if password is None or password != self.author.password:
-            self.available = True
+            with Concurrency.posts.lock(self.post_id):
+                if not self.available:
+                    self.available = True
+                    self._invalidate()
+                    self._emit("on_available")
             return False
         else:
-            self.available = False
-            print(self.author.username + "'s product is sold")
+            with Concurrency.posts.lock(self.post_id):
+                self.available = False
+                self._invalidate()
+                self._emit("on_sold")
+            EventSink.emit("sold", self.author.username + "'s product is sold", author=self.author.username, item=self.item)
             return True
     """
     Applies a discount to the item price and notify others.
@@ -299,15 +516,14 @@ class SalePost(Like, Comment):
     def discount(self, dis, password: str):
         if password != self.author.password:
             raise Exception("password isn't correct")
-        elif not self.available:
-            raise Exception("Cant preform discount on unavailable post")
-        else:
+        with Concurrency.posts.lock(self.post_id):
+            if not self.available:
+                raise Exception("Cant preform discount on unavailable post")
             self.price = (self.price) * ((100 - dis) / 100)
-            print("Discount on " + self.author.username + " product! the new price is: " + str(self.price))
+            self._invalidate()
+            price = self.price
+            self._emit("on_discount", dis)
+        EventSink.emit("discount", "Discount on " + self.author.username + " product! the new price is: " + str(price),
+                       author=self.author.username, item=self.item, discount=dis, price=price)
 
-    """
-    Method for printing the SalePost object
-    """
-    def __str__(self):
-        return self.author.username + self.notification()+"\n"
 
@@ -0,0 +1,165 @@
+import heapq
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from PostFactory import TextPost
+from Marketplace import tokenize
+
+
+# Full text search over the text posts and the comments of a network.
+
+class SearchIndex:
+    """
+    Inverted index of the words of the text posts and of the comments, ranked with BM25.
+
+    The text of a post is its content (for text posts) and the texts of its comments.
+    For every word the index keeps its postings: the ids of the posts containing it, sorted,
+    and the number of times it appears in each one, in two arrays of C ints.
+    The index listens to the graph, a published text post or a new comment only adds its words.
+    A query reads the postings of its words, rarest first, and stops scanning them once the posts
+    not found yet can't reach the top anymore (MaxScore pruning), so the long postings of
+    common words are mostly only probed for the candidates.
+
+    Attributes:
+        graph (SocialGraph): The graph of the indexed posts.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+        postings (dict): [post ids, frequencies] arrays keyed by word.
+        lengths (array): The number of indexed words of every post, indexed by post id.
+        documents (int): The number of posts having indexed words.
+        total_length (int): The number of indexed words of all the posts.
+    """
+
+    def __init__(self, graph, k1: float = 1.2, b: float = 0.75):
+        self.graph = graph
+        self.k1 = k1
+        self.b = b
+        self.postings = dict()
+        self.lengths = array('i')
+        self.documents = 0
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    """
+    Indexes again all the posts of the graph, e.g. after they were loaded without events.
+    """
+
+    def rebuild(self):
+        with self._lock:
+            self.postings.clear()
+            self.lengths = array('i')
+            self.documents = 0
+            self.total_length = 0
+            for post in self.graph.posts:
+                if isinstance(post, TextPost):
+                    self._add(post.post_id, post.content)
+                for text in post.comments.texts:
+                    self._add(post.post_id, text)
+
+    """
+    Returns the limit posts matching query best, best first.
+    A post matches if it contains at least one of the words of the query.
+    """
+
+    def search(self, query: str, limit: int = 10) -> list:
+        if limit <= 0:
+            return []
+        with self._lock:
+            if not self.documents:
+                return []
+            k1 = self.k1
+            lengths = self.lengths
+            average = self.total_length / self.documents
+            # The length normalization of a post doesn't depend on the query words
+            norm = k1 * (1 - self.b)
+            per_word = k1 * self.b / average
+            terms = []
+            for word in set(tokenize(query)):
+                entry = self.postings.get(word)
+                if entry is not None:
+                    ids, frequencies = entry
+                    idf = math.log(1 + (self.documents - len(ids) + 0.5) / (len(ids) + 0.5))
+                    terms.append((len(ids), idf * (k1 + 1), ids, frequencies))
+            # Rare words first: they weigh the most and have the shortest postings
+            terms.sort(key=lambda term: term[0])
+            remaining = sum(term[1] for term in terms)
+            scores = dict()
+            for position, (_, weight, ids, frequencies) in enumerate(terms):
+                if len(scores) >= limit and position:
+                    threshold = heapq.nlargest(limit, scores.values())[-1]
+                    if threshold >= remaining:
+                        # A post not found yet scores at most remaining (a word adds less than its weight),
+                        # so it can't enter the top: the other words only update the candidates
+                        self._probe(scores, terms[position:], threshold, norm, per_word)
+                        break
+                get = scores.get
+                for post_id, frequency in zip(ids, frequencies):
+                    scores[post_id] = get(post_id, 0.0) + weight * frequency / (
+                        frequency + norm + per_word * lengths[post_id])
+                remaining -= weight
+            best = heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+            posts = self.graph.posts
+            return [posts[post_id] for post_id, _ in best]
+
+    """
+    Adds the scores of the words of terms to the candidate posts of scores,
+    finding each candidate in the postings with a binary search.
+    Candidates that can't reach threshold anymore are dropped.
+    """
+
+    def _probe(self, scores: dict, terms: list, threshold: float, norm: float, per_word: float):
+        lengths = self.lengths
+        remaining = sum(term[1] for term in terms)
+        for _, weight, ids, frequencies in terms:
+            for post_id in list(scores):
+                score = scores[post_id]
+                if score + remaining < threshold:
+                    del scores[post_id]
+                    continue
+                index = bisect_left(ids, post_id)
+                if index < len(ids) and ids[index] == post_id:
+                    frequency = frequencies[index]
+                    scores[post_id] = score + weight * frequency / (frequency + norm + per_word * lengths[post_id])
+            remaining -= weight
+
+    def on_publish(self, user, post):
+        if isinstance(post, TextPost):
+            with self._lock:
+                self._add(post.post_id, post.content)
+
+    def on_comment(self, post, user, text):
+        with self._lock:
+            self._add(post.post_id, text)
+
+    def _add(self, post_id: int, text: str):
+        words = tokenize(text)
+        if not words:
+            return
+        counts = dict()
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            entry = self.postings.get(word)
+            if entry is None:
+                self.postings[word] = [array('i', (post_id,)), array('i', (count,))]
+                continue
+            ids, frequencies = entry
+            # Posts are mostly indexed in publish order, so the id usually goes at the end
+            if not ids or ids[-1] < post_id:
+                ids.append(post_id)
+                frequencies.append(count)
+                continue
+            index = bisect_left(ids, post_id)
+            if index < len(ids) and ids[index] == post_id:
+                frequencies[index] += count
+            else:
+                ids.insert(index, post_id)
+                frequencies.insert(index, count)
+        lengths = self.lengths
+        if len(lengths) <= post_id:
+            lengths.extend(array('i', [0]) * (post_id + 1 - len(lengths)))
+        if lengths[post_id] == 0:
+            self.documents += 1
+        lengths[post_id] += len(words)
+        self.total_length += len(words)
@@ -0,0 +1,286 @@
+import struct
+import sys
+from array import array
+from PostFactory import PostFactory, TextPost, ImagePost, SalePost
+from Notification import Notification, Inbox
+from User import User
+
+
+# Saves and loads the whole state of a social network in a compact binary file.
+#
+# The file starts with a header (magic, version, byte order) followed by tables of fixed order:
+#   name, users, edges, posts, likes, comments, notifications, inboxes and pulled notifications.
+# Users and posts are referred to by their integer id in the graph, and the arrays of the graph
+# are written as raw C ints, so loading reads them straight into arrays without a Python object per edge.
+# Every table is written and read sequentially, so neither side builds the whole file in memory.
+
+MAGIC = b"SNET"
+VERSION = 3
+
+_POST_TYPES = {TextPost: 0, ImagePost: 1, SalePost: 2}
+_NOTIFICATION_KINDS = [Notification.NEW_POST, Notification.LIKE, Notification.COMMENT]
+_TEXT_NOTIFICATION = 255
+
+
+class SnapshotWriter:
+    """
+    Writes the values of a snapshot to a binary file.
+
+    Attributes:
+        file: The binary file written to.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def pack(self, format: str, *values):
+        self.file.write(struct.pack("<" + format, *values))
+
+    def string(self, value: str):
+        data = value.encode("utf-8")
+        self.pack("I", len(data))
+        self.file.write(data)
+
+    def ints(self, values: array):
+        self.file.write(values.tobytes())
+
+    def doubles(self, values: array):
+        self.file.write(values.tobytes())
+
+    def longs(self, values: array):
+        self.file.write(values.tobytes())
+
+
+class SnapshotReader:
+    """
+    Reads the values of a snapshot from a binary file.
+
+    Attributes:
+        file: The binary file read from.
+        swap (bool): Whether the raw arrays were written with the other byte order.
+    """
+
+    def __init__(self, file, swap: bool = False):
+        self.file = file
+        self.swap = swap
+
+    def unpack(self, format: str):
+        format = "<" + format
+        data = self.file.read(struct.calcsize(format))
+        if len(data) < struct.calcsize(format):
+            raise Exception("Snapshot file is truncated")
+        return struct.unpack(format, data)
+
+    def string(self) -> str:
+        size, = self.unpack("I")
+        return self.file.read(size).decode("utf-8")
+
+    def ints(self, count: int) -> array:
+        return self._array('i', count)
+
+    def doubles(self, count: int) -> array:
+        return self._array('d', count)
+
+    def longs(self, count: int) -> array:
+        return self._array('q', count)
+
+    def _array(self, typecode: str, count: int) -> array:
+        values = array(typecode)
+        if count:
+            values.fromfile(self.file, count)
+            if self.swap:
+                values.byteswap()
+        return values
+
+
+"""
+Writes the state of the network to the file at path.
+Queued fan-out deliveries are delivered first, the feed cache isn't saved.
+"""
+
+def save(network, path: str):
+    graph = network.graph
+    graph.fanout.flush()
+    with open(path, "wb") as file:
+        writer = SnapshotWriter(file)
+        file.write(MAGIC)
+        writer.pack("HB", VERSION, sys.byteorder == "little")
+        writer.string(network.name)
+
+        users = graph.users
+        writer.pack("I", len(users))
+        for user in users:
+            writer.string(user.username)
+            writer.string(user.password)
+            writer.pack("B", user.connected)
+        for uid in range(len(users)):
+            writer.pack("II", len(graph.following[uid]), len(graph.followers[uid]))
+            writer.ints(graph.following[uid])
+            writer.ints(graph.following_pos[uid])
+            writer.ints(graph.followers[uid])
+            writer.ints(graph.followers_pos[uid])
+
+        posts = graph.posts
+        writer.pack("I", len(posts))
+        for post in posts:
+            post_type = _POST_TYPES[type(post)]
+            writer.pack("BId", post_type, post.author.uid, post.timestamp)
+            if post_type == 0:
+                writer.string(post.content)
+            elif post_type == 1:
+                writer.string(post.path)
+            else:
+                writer.string(post.item)
+                if isinstance(post.price, int):
+                    writer.pack("Bq", 0, post.price)
+                else:
+                    writer.pack("Bd", 1, post.price)
+                writer.string(post.location)
+                writer.pack("B", post.available)
+        for post in posts:
+            # Read without merging the pending likes, which would take the lock of the post
+            likers = post.liker_ids()
+            writer.pack("I", len(likers))
+            writer.ints(likers)
+        for post in posts:
+            comments = post.comments
+            writer.pack("I", len(comments))
+            writer.ints(comments.users)
+            writer.doubles(comments.times)
+            for text in comments.texts:
+                writer.string(text)
+
+        # Notifications shared by several inboxes are written once and referred to by their index
+        fanout = graph.fanout
+        table = dict()
+        records = []
+        pulled = [entry[1] for history in fanout.pulled.values() for entry in history]
+        for notifications in [user.notifications for user in users] + [pulled]:
+            for notification in notifications:
+                if id(notification) not in table:
+                    table[id(notification)] = len(records)
+                    records.append(notification)
+        writer.pack("I", len(records))
+        for notification in records:
+            if isinstance(notification, Notification):
+                post_id = notification.post.post_id if notification.post is not None else -1
+                writer.pack("BIid", _NOTIFICATION_KINDS.index(notification.kind), notification.actor.uid,
+                            -1 if post_id is None else post_id, notification.timestamp)
+            else:
+                writer.pack("B", _TEXT_NOTIFICATION)
+                writer.string(str(notification))
+        for user in users:
+            inbox = user.notifications
+            writer.pack("IQQI", inbox.capacity, inbox.total, inbox.read, len(inbox))
+            writer.ints(array('i', (table[id(notification)] for notification in inbox)))
+
+        # The notifications of the pulled authors not pulled yet by their followers
+        writer.pack("qI", fanout.sequence, len(fanout.pulled))
+        writer.longs(fanout.cursors)
+        for author, history in fanout.pulled.items():
+            writer.pack("II", author, len(history))
+            writer.longs(array('q', (entry[0] for entry in history)))
+            writer.ints(array('i', (table[id(entry[1])] for entry in history)))
+
+
+"""
+Loads the network saved at path into the social network class network_class and returns it.
+"""
+
+def load(network_class, path: str):
+    with open(path, "rb") as file:
+        if file.read(4) != MAGIC:
+            raise Exception("Not a social network snapshot")
+        reader = SnapshotReader(file)
+        version, little = reader.unpack("HB")
+        if version not in (1, 2, VERSION):
+            raise Exception("Unsupported snapshot version " + str(version))
+        reader.swap = bool(little) != (sys.byteorder == "little")
+        network = network_class(reader.string())
+        graph = network.graph
+
+        count, = reader.unpack("I")
+        users = []
+        for _ in range(count):
+            username = reader.string()
+            password = reader.string()
+            connected, = reader.unpack("B")
+            user = User(username, password, graph)
+            user.connected = bool(connected)
+            network.registry[username] = user
+            if user.connected:
+                network.users.add(user)
+            else:
+                network.logedoutUsers[username] = user
+            users.append(user)
+        for uid in range(count):
+            following, followers = reader.unpack("II")
+            graph.following[uid] = reader.ints(following)
+            graph.following_pos[uid] = reader.ints(following)
+            graph.followers[uid] = reader.ints(followers)
+            graph.followers_pos[uid] = reader.ints(followers)
+        graph.build_indexes()
+
+        count, = reader.unpack("I")
+        posts = graph.posts
+        for _ in range(count):
+            post_type, author, timestamp = reader.unpack("BId")
+            author = users[author]
+            if post_type == 0:
+                post = PostFactory.create_post("Text", reader.string(), author=author)
+            elif post_type == 1:
+                post = PostFactory.create_post("Image", reader.string(), author=author)
+            else:
+                item = reader.string()
+                is_float, = reader.unpack("B")
+                price, = reader.unpack("d" if is_float else "q")
+                location = reader.string()
+                post = PostFactory.create_post("Sale", item, price, location, author=author)
+                available, = reader.unpack("B")
+                post.available = bool(available)
+            post.post_id = len(posts)
+            post.timestamp = timestamp
+            posts.append(post)
+            author.posts.append(post)
+        for post in posts:
+            likes, = reader.unpack("I")
+            # Sorted again in case the ids were written in another order
+            post.likers = array('i', sorted(reader.ints(likes)))
+        for post in posts:
+            comments, = reader.unpack("I")
+            if version == 1:
+                # Version 1 kept the last comment of each user, without its time
+                for _ in range(comments):
+                    uid, = reader.unpack("i")
+                    post.comments.append(users[uid], reader.string(), post.timestamp)
+            else:
+                commenters = reader.ints(comments)
+                times = reader.doubles(comments)
+                post.comments.restore(commenters, times, [reader.string() for _ in range(comments)])
+
+        count, = reader.unpack("I")
+        records = []
+        for _ in range(count):
+            kind, = reader.unpack("B")
+            if kind == _TEXT_NOTIFICATION:
+                records.append(reader.string())
+                continue
+            actor, post_id, timestamp = reader.unpack("Iid")
+            records.append(Notification(_NOTIFICATION_KINDS[kind], users[actor],
+                                        posts[post_id] if post_id >= 0 else None, timestamp))
+        for user in users:
+            capacity, total, read, kept = reader.unpack("IQQI")
+            inbox = Inbox(capacity)
+            inbox.restore((records[index] for index in reader.ints(kept)), total, read)
+            user.notifications = inbox
+
+        if version >= 3:
+            fanout = graph.fanout
+            fanout.sequence, count = reader.unpack("qI")
+            fanout.cursors = reader.longs(len(users))
+            for _ in range(count):
+                author, size = reader.unpack("II")
+                sequences = reader.longs(size)
+                fanout.pulled[author] = [(sequence, records[index])
+                                         for sequence, index in zip(sequences, reader.ints(size))]
+    return network
@@ -0,0 +1,324 @@
+import threading
+import time
+from array import array
+from FanOut import FanOut
+
+
+# Compact storage of the follow relations between users.
+
+class SocialGraph:
+    """
+    Stores who follows whom using dense integer user ids and arrays of C ints.
+
+    Every edge a -> b (a follows b) is kept twice: b in following[a] and a in followers[b].
+    Next to each entry the graph keeps the position of its twin entry in the other array,
+    so an edge can be removed from both sides by swapping it with the last entry,
+    without scanning the (possibly huge) followers array of b.
+    Each edge costs 16 bytes and no Python object.
+    A user following more than index_threshold users also gets a dict from target id to position
+    in its following array, so checking, adding or removing one of its edges doesn't scan the array;
+    the following array of a user without an index is short, so scanning it is bounded by index_threshold.
+    The arrays are only changed under edges_lock, so follows and unfollows of different threads don't mix.
+
+    Attributes:
+        users (list): The users of the graph, indexed by their id.
+        following (list): For every user id, an array of the ids this user follows.
+        followers (list): For every user id, an array of the ids following this user.
+        following_pos (list): For every user id, the position of each following edge in followers of the target.
+        followers_pos (list): For every user id, the position of each follower edge in following of the source.
+        following_index (list): For every user id, None or a dict of the position of each target in following.
+        index_threshold (int): The number of users a user follows above which its following is indexed.
+        fanout (FanOut): The engine delivering the new post notifications of the users to their followers.
+        posts (list): The published posts, indexed by their id (ids grow in publish order).
+        listeners (list): Objects notified about changes of the graph through their on_<event> methods.
+        edges_lock (RLock): The lock held while the arrays are changed and the follow events are emitted.
+    """
+
+    def __init__(self, index_threshold: int = 32):
+        self.users = []
+        self.following = []
+        self.followers = []
+        self.following_pos = []
+        self.followers_pos = []
+        self.following_index = []
+        self.index_threshold = index_threshold
+        self.fanout = FanOut(self)
+        self.posts = []
+        self.listeners = []
+        self.edges_lock = threading.RLock()
+        self._ids_lock = threading.Lock()
+
+    """
+    Adds a user to the graph and returns its new id.
+    """
+
+    def add_user(self, user) -> int:
+        with self._ids_lock:
+            uid = len(self.users)
+            self.following.append(array('i'))
+            self.followers.append(array('i'))
+            self.following_pos.append(array('i'))
+            self.followers_pos.append(array('i'))
+            self.following_index.append(None)
+            self.fanout.add_user(uid)
+            self.users.append(user)
+        return uid
+
+    """
+    Registers a published post, setting its id and publish time.
+    """
+
+    def add_post(self, post) -> int:
+        with self._ids_lock:
+            post.post_id = len(self.posts)
+            post.timestamp = time.time()
+            self.posts.append(post)
+        return post.post_id
+
+    """
+    Adds a listener notified about the events of the graph.
+    A listener implements the on_<event> methods it is interested in:
+        on_sign_up(user), on_log_in(user), on_log_out(user),
+        on_follow(user, followed), on_unfollow(user, unfollowed), on_publish(user, post),
+        on_like(post, user), on_comment(post, user, text), on_discount(post, dis), on_sold(post),
+        on_available(post) (a sold item put back on sale).
+    The events are emitted after the change was applied.
+    """
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    """
+    Removes a listener added by subscribe.
+    """
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    """
+    Calls the method named event with the given arguments on every listener that implements it.
+    """
+
+    def emit(self, event: str, *args):
+        for listener in self.listeners:
+            handler = getattr(listener, event, None)
+            if handler is not None:
+                handler(*args)
+
+    """
+    Returns True if the user with id a follows the user with id b.
+    """
+
+    def is_following(self, a: int, b: int) -> bool:
+        index = self.following_index[a]
+        if index is not None:
+            return b in index
+        return b in self.following[a]
+
+    """
+    Indexes the following arrays that were filled directly, e.g. by loading a snapshot.
+    """
+
+    def build_indexes(self):
+        with self.edges_lock:
+            for a, following in enumerate(self.following):
+                self.following_index[a] = None
+                self._index(a, len(following) - 1)
+
+    """
+    Adds the edge a -> b and emits on_follow.
+    Returns False if a already follows b.
+    """
+
+    def follow(self, a: int, b: int) -> bool:
+        with self.edges_lock:
+            if self._position(a, b) >= 0:
+                return False
+            self._append(a, b)
+            self.emit("on_follow", self.users[a], self.users[b])
+        return True
+
+    """
+    Adds the edges of the (a, b) id pairs under one lock acquisition and emits on_follow for each new one.
+    Returns the number of edges added.
+    """
+
+    def follow_many(self, pairs) -> int:
+        added = 0
+        users = self.users
+        handlers = [getattr(listener, "on_follow") for listener in self.listeners
+                    if hasattr(listener, "on_follow")]
+        with self.edges_lock:
+            for a, b in pairs:
+                if self._position(a, b) >= 0:
+                    continue
+                self._append(a, b)
+                for handler in handlers:
+                    handler(users[a], users[b])
+                added += 1
+        return added
+
+    """
+    Removes the edge a -> b and emits on_unfollow.
+    Returns False if a doesn't follow b.
+    """
+
+    def unfollow(self, a: int, b: int) -> bool:
+        with self.edges_lock:
+            i = self._position(a, b)
+            if i < 0:
+                return False
+            j = self.following_pos[a][i]
+            self._remove_following(a, i)
+            self._remove_follower(b, j)
+            self.emit("on_unfollow", self.users[a], self.users[b])
+        return True
+
+    """
+    Returns a copy of the ids following the user with id uid, taken while no edge is changed.
+    """
+
+    def followers_snapshot(self, uid: int) -> array:
+        with self.edges_lock:
+            return array('i', self.followers[uid])
+
+    """
+    Returns the number of users following the user with id uid.
+    """
+
+    def follower_count(self, uid: int) -> int:
+        return len(self.followers[uid])
+
+    """
+    Returns the number of users the user with id uid follows.
+    """
+
+    def following_count(self, uid: int) -> int:
+        return len(self.following[uid])
+
+    """
+    Returns the total number of edges in the graph.
+    """
+
+    def edge_count(self) -> int:
+        return sum(len(following) for following in self.following)
+
+    """
+    Returns the position of b in the following array of a, -1 if a doesn't follow b.
+    """
+
+    def _position(self, a: int, b: int) -> int:
+        index = self.following_index[a]
+        if index is not None:
+            return index.get(b, -1)
+        try:
+            return self.following[a].index(b)
+        except ValueError:
+            return -1
+
+    """
+    Appends the edge a -> b to both arrays.
+    """
+
+    def _append(self, a: int, b: int):
+        following = self.following[a]
+        followers = self.followers[b]
+        self.following_pos[a].append(len(followers))
+        self.followers_pos[b].append(len(following))
+        following.append(b)
+        followers.append(a)
+        self._index(a, len(following) - 1)
+
+    """
+    Records the target at position i of the following array of a in its index,
+    creating the index once the array grows past index_threshold.
+    """
+
+    def _index(self, a: int, i: int):
+        index = self.following_index[a]
+        following = self.following[a]
+        if index is not None:
+            index[following[i]] = i
+        elif len(following) > self.index_threshold:
+            self.following_index[a] = {target: position for position, target in enumerate(following)}
+
+    """
+    Removes position i from the following array of a.
+    The last edge is moved into the hole and its twin in followers of the target is updated.
+    """
+
+    def _remove_following(self, a: int, i: int):
+        following = self.following[a]
+        positions = self.following_pos[a]
+        index = self.following_index[a]
+        if index is not None:
+            del index[following[i]]
+        last = len(following) - 1
+        if i != last:
+            target = following[last]
+            following[i] = target
+            positions[i] = positions[last]
+            self.followers_pos[target][positions[i]] = i
+            if index is not None:
+                index[target] = i
+        following.pop()
+        positions.pop()
+
+    """
+    Removes position j from the followers array of b.
+    The last edge is moved into the hole and its twin in following of the source is updated.
+    """
+
+    def _remove_follower(self, b: int, j: int):
+        followers = self.followers[b]
+        positions = self.followers_pos[b]
+        last = len(followers) - 1
+        if j != last:
+            source = followers[last]
+            followers[j] = source
+            positions[j] = positions[last]
+            self.following_pos[source][positions[j]] = j
+        followers.pop()
+        positions.pop()
+
+
+class UsersView:
+    """
+    A read only view over one adjacency array of the graph that yields User objects.
+
+    Attributes:
+        graph (SocialGraph): The graph holding the array.
+        ids (array): The ids of the users in the view.
+        owner (int): The id of the user owning the array.
+        outgoing (bool): True for the users the owner follows, False for the users following the owner.
+    """
+
+    def __init__(self, graph: SocialGraph, owner: int, outgoing: bool):
+        self.graph = graph
+        self.owner = owner
+        self.outgoing = outgoing
+        self.ids = graph.following[owner] if outgoing else graph.followers[owner]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        users = self.graph.users
+        for uid in self.ids:
+            yield users[uid]
+
+    """
+    Membership is always answered from the following array of the follower,
+    so checking a follower of a celebrity doesn't scan the celebrity's followers.
+    """
+
+    def __contains__(self, user):
+        if getattr(user, "graph", None) is not self.graph:
+            return False
+        if self.outgoing:
+            return self.graph.is_following(self.owner, user.uid)
+        return self.graph.is_following(user.uid, self.owner)
+
+
+# The graph used by users that are created outside a social network.
+default_graph = SocialGraph()
@@ -1,5 +1,17 @@
+import io
 from User import User
-from Exceptions import LogInLogoutError
+from SortedUsers import SortedUsers
+from SocialGraph import SocialGraph
+from Timeline import FeedCache
+from Marketplace import Marketplace
+from SearchIndex import SearchIndex
+from Engagement import Engagement
+import Snapshot
+import EventSink
+import Concurrency
+from BulkResult import BulkResult
+from Exceptions import ensure_can_sign_up, ensure_can_log_in, ensure_can_log_out
+from Exceptions import ALREADY_EXIST, INVALID_PASSWORD, INVALID_USERNAME, NOT_FOUND, CANT_FOLLOW, FOLLOW_YOURSELF, OTHER_NETWORK
 
 
 # Represents a singleton instance of a social network.
@@ -10,9 +22,15 @@ class SocialNetwork:
 
     Attributes:
         _instance (SocialNetwork): The singleton instance of the social network.
-        users (list): A list of active users in the social network.
+        users (SortedUsers): The active users of the social network, sorted by username.
         name: The name of the social network.
-        logedoutUsers (dict): A dictionary containing logged-out users and their passwords.
+        logedoutUsers (dict): A dictionary containing logged-out users keyed by their username.
+        registry (dict): An index of every signed up user (connected or not) keyed by username.
+        graph (SocialGraph): The graph storing the follow relations between the users.
+        feeds (FeedCache): The cache of the home timelines of the users.
+        marketplace (Marketplace): The index of the sale posts.
+        search_index (SearchIndex): The full text index of the text posts and comments.
+        engagement (Engagement): The counters and leaderboards of the activity of the users.
 
     """
     _instance = None
@@ -28,9 +46,19 @@ class SocialNetwork:
     """
 
     def __new__(cls, name: str):
-        cls.users = []
+        cls.users = SortedUsers()
         cls.name = name
         cls.logedoutUsers = dict()
+        cls.registry = dict()
+        cls.graph = SocialGraph()
+        cls.feeds = FeedCache(cls.graph)
+        cls.graph.subscribe(cls.feeds)
+        cls.marketplace = Marketplace(cls.graph)
+        cls.graph.subscribe(cls.marketplace)
+        cls.search_index = SearchIndex(cls.graph)
+        cls.graph.subscribe(cls.search_index)
+        cls.engagement = Engagement(cls.graph)
+        cls.graph.subscribe(cls.engagement)
         # If an instance does not exist, create one
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -48,11 +76,12 @@ class SocialNetwork:
     """
 
     def sign_up(self, username: str, password: str):
-        exception = LogInLogoutError(self,username)
-        exception.signUpError(username, password)
-        exception.notValidPassword(password)
-        user = User(username, password)
-        self.users.append(user)
+        with Concurrency.names.lock(username):
+            ensure_can_sign_up(self, username, password)
+            user = User(username, password, self.graph)
+            self.users.add(user)
+            self.registry[username] = user
+            self.graph.emit("on_sign_up", user)
         return user
 
     """
@@ -63,16 +92,15 @@ class SocialNetwork:
     """
 
     def log_in(self, username: str, password: str):
-        exception = LogInLogoutError(self,username)
-        exception.logInError(username, password)
-        exception.logInUserIsentExistError(username, password)
-        for user in self.logedoutUsers:
-            if self.logedoutUsers[user] == password:
+        with Concurrency.names.lock(username):
+            ensure_can_log_in(self, username, password)
+            user = self.logedoutUsers[username]
+            with Concurrency.users.lock(user.uid):
+                del self.logedoutUsers[username]
                 user.connect()
-                self.logedoutUsers.pop(user)
-                self.users.append(user)
-                print(user.username + " connected")
-                break;
+                self.users.add(user)
+                self.graph.emit("on_log_in", user)
+        EventSink.emit("log_in", user.username + " connected", user=user.username)
 
     """
      Logs out a user from the social network.
@@ -81,25 +109,183 @@ class SocialNetwork:
          LogInLogoutError: If there is an error during the logout process, such as user not found or already logged out.
      """
     def log_out(self, username: str):
-        exception = LogInLogoutError(self,username)
-        exception.logOutError(username)
-        exception.loggedOutNotFound(username)
-        for user in self.users:
-            if user.username == username:
+        with Concurrency.names.lock(username):
+            ensure_can_log_out(self, username)
+            user = self.registry[username]
+            with Concurrency.users.lock(user.uid):
                 user.disconnect()
                 self.users.remove(user)
-                self.logedoutUsers.update({user : user.password})
-                print(user.username+" disconnected")
-                break;
+                self.logedoutUsers[username] = user
+                self.graph.emit("on_log_out", user)
+        EventSink.emit("log_out", user.username+" disconnected", user=user.username)
+
+    """
+    Registers many users at once, e.g. when seeding or migrating the network.
+    Each entry is checked like in sign_up, a rejected entry is recorded and the others go on.
+
+    Args:
+        entries: An iterable of (username, password) pairs, a username or password that isn't a string is rejected.
+
+    Returns:
+        BulkResult: The created users and the rejected entries with the reason.
+    """
+
+    def bulk_sign_up(self, entries) -> BulkResult:
+        result = BulkResult()
+        registry = self.registry
+        users = self.users
+        graph = self.graph
+        for index, (username, password) in enumerate(entries):
+            if not isinstance(username, str):
+                result.fail(index, username, INVALID_USERNAME)
+                continue
+            if not isinstance(password, str):
+                result.fail(index, username, INVALID_PASSWORD)
+                continue
+            with Concurrency.names.lock(username):
+                if username in registry:
+                    result.fail(index, username, ALREADY_EXIST)
+                    continue
+                if not 4 <= len(password) <= 8:
+                    result.fail(index, username, INVALID_PASSWORD)
+                    continue
+                user = User(username, password, graph)
+                users.add(user)
+                registry[username] = user
+                graph.emit("on_sign_up", user)
+            result.add(user)
+        return result
+
+    """
+    Makes many users follow other users at once, without an event message per follow.
+    The pairs are checked in one pass and the new edges are added to the graph under one lock.
+    Following an already followed user has no effect, like in User.follow.
+
+    Args:
+        pairs: An iterable of (follower, followed) pairs of users or usernames, anything else is rejected as not found.
+
+    Returns:
+        BulkResult: The applied pairs and the rejected ones with the reason.
+    """
+
+    def bulk_follow(self, pairs) -> BulkResult:
+        result = BulkResult()
+        registry = self.registry
+        graph = self.graph
+        edges = []
+        for index, pair in enumerate(pairs):
+            user, followed = pair
+            user = registry.get(user) if isinstance(user, str) else user
+            followed = registry.get(followed) if isinstance(followed, str) else followed
+            if not isinstance(user, User) or not isinstance(followed, User):
+                result.fail(index, pair, NOT_FOUND)
+            elif not user.connected:
+                result.fail(index, pair, CANT_FOLLOW)
+            elif user is followed:
+                result.fail(index, pair, FOLLOW_YOURSELF)
+            elif user.graph is not graph or followed.graph is not graph:
+                result.fail(index, pair, OTHER_NETWORK)
+            else:
+                edges.append((user.uid, followed.uid))
+                result.add(pair)
+        graph.follow_many(edges)
+        return result
+
+    """
+    Returns the latest posts of the users followed by user, newest first.
+
+    Args:
+        user (User): The user reading its home timeline.
+        limit (int): The maximal number of posts returned.
+    """
+
+    def timeline(self, user: User, limit: int = 20):
+        return self.feeds.timeline(user, limit)
+
+    """
+    Returns the limit posts whose content or comments match query best (BM25 ranking), best first.
+    """
+
+    def search(self, query: str, limit: int = 10):
+        return self.search_index.search(query, limit)
+
+    """
+    Returns the k most liked posts as (post, likes) pairs, most liked first.
+    """
+
+    def most_liked_posts(self, k: int = 10):
+        return self.engagement.top_posts(k)
+
+    """
+    Returns the k most followed users as (user, followers) pairs, most followed first.
+    """
+
+    def most_followed_users(self, k: int = 10):
+        return self.engagement.top_users(k)
+
+    """
+    Returns the sale posts matching all the given filters, cheapest first,
+    e.g. search_listings("toyota", max_price=40000, location="Haifa").
+
+    Args:
+        query (str): Words that must all appear in the item.
+        min_price: The minimal price (included).
+        max_price: The maximal price (included).
+        location (str): The pickup location, case insensitive.
+        available (bool): True for available posts only, False for sold ones only, None for both.
+        limit (int): The maximal number of posts returned, None for all of them.
+    """
+
+    def search_listings(self, query: str = None, min_price=None, max_price=None, location: str = None,
+                        available: bool = True, limit: int = None):
+        return self.marketplace.search(query, min_price, max_price, location, available, limit)
+
+    """
+    Saves the whole state of the network (users, follows, posts, likes, comments and notifications)
+    to a compact binary snapshot file.
+    """
+
+    def save(self, path: str):
+        Snapshot.save(self, path)
+
+    """
+    Loads a network saved by save, replacing the state of the singleton network.
+
+    Returns:
+        SocialNetwork: The loaded social network.
+    """
+
+    @classmethod
+    def load(cls, path: str):
+        network = Snapshot.load(cls, path)
+        # The loaded posts weren't published through the graph
+        network.marketplace.rebuild()
+        network.search_index.rebuild()
+        network.engagement.rebuild()
+        return network
+
+    """
+    Writes the name of the social network and its active users, sorted alphabetically by username,
+    to the text file object file, a batch of lines at a time.
+    The users are kept sorted, so the cost is linear in their number and nothing is changed.
+    """
+    def write(self, file, batch_size: int = 1024):
+        file.write(self.name + " social network:\n")
+        lines = []
+        for user in self.users:
+            lines.append(user.__str__() + "\n")
+            if len(lines) == batch_size:
+                file.write("".join(lines))
+                lines = []
+        if lines:
+            file.write("".join(lines))
 
     """
     Returns a string representation of the social network, including its name and active users.
     Users are sorted alphabetically by username
     """
     def __str__(self):
-        s = self.name +" social network:\n"
-        self.users.sort(key=lambda user: user.username, reverse=False)
-        for user in self.users:
-            s += user.__str__()+"\n"
-        return s
+        buffer = io.StringIO()
+        self.write(buffer)
+        return buffer.getvalue()
 
@@ -0,0 +1,127 @@
+import threading
+from bisect import bisect_left
+
+
+# The connected users of a network, kept in username order.
+
+class SortedUsers:
+    """
+    Users sorted by username, stored in a list of sorted buckets of at most 2 * load users.
+
+    A user is added or removed by finding its bucket with a binary search over the last
+    username of every bucket and shifting the entries of that bucket only,
+    so it costs O(log n + load) instead of O(n) for a sorted list,
+    and the users are read in order without sorting them.
+    Iterating while other threads change the users is safe but may miss their changes.
+
+    Attributes:
+        load (int): The size of the buckets made when the users are split.
+    """
+
+    def __init__(self, users=(), load: int = 1000):
+        self.load = load
+        self._keys = []
+        self._users = []
+        self._maxes = []
+        self._size = 0
+        self._lock = threading.RLock()
+        self.update(users)
+
+    """
+    Adds a user, a user already there is ignored.
+    """
+
+    def add(self, user):
+        with self._lock:
+            key = user.username
+            if not self._maxes:
+                self._keys.append([key])
+                self._users.append([user])
+                self._maxes.append(key)
+                self._size += 1
+                return
+            index = min(bisect_left(self._maxes, key), len(self._maxes) - 1)
+            keys = self._keys[index]
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                return
+            keys.insert(position, key)
+            self._users[index].insert(position, user)
+            self._maxes[index] = keys[-1]
+            self._size += 1
+            if len(keys) > 2 * self.load:
+                self._split(index)
+
+    """
+    Adds many users, sorting them all at once when they are many compared to the users already there.
+    """
+
+    def update(self, users):
+        users = list(users)
+        with self._lock:
+            if len(users) * 8 < self._size:
+                for user in users:
+                    self.add(user)
+                return
+            merged = {user.username: user for user in self}
+            for user in users:
+                merged.setdefault(user.username, user)
+            keys = sorted(merged)
+            load = self.load
+            self._keys = [keys[start:start + load] for start in range(0, len(keys), load)]
+            self._users = [[merged[key] for key in bucket] for bucket in self._keys]
+            self._maxes = [bucket[-1] for bucket in self._keys]
+            self._size = len(keys)
+
+    """
+    Removes a user.
+    Raises:
+        ValueError: If the user isn't there.
+    """
+
+    def remove(self, user):
+        with self._lock:
+            key = user.username
+            index = bisect_left(self._maxes, key)
+            if index < len(self._maxes):
+                keys = self._keys[index]
+                position = bisect_left(keys, key)
+                if position < len(keys) and keys[position] == key:
+                    del keys[position]
+                    del self._users[index][position]
+                    self._size -= 1
+                    if keys:
+                        self._maxes[index] = keys[-1]
+                    else:
+                        del self._keys[index]
+                        del self._users[index]
+                        del self._maxes[index]
+                    return
+            raise ValueError("User " + key + " isn't in the users")
+
+    def __contains__(self, user):
+        key = getattr(user, "username", None)
+        if key is None:
+            return False
+        with self._lock:
+            index = bisect_left(self._maxes, key)
+            if index == len(self._maxes):
+                return False
+            keys = self._keys[index]
+            position = bisect_left(keys, key)
+            return position < len(keys) and self._users[index][position] is user
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for bucket in list(self._users):
+            yield from bucket
+
+    def _split(self, index: int):
+        keys = self._keys[index]
+        users = self._users[index]
+        half = len(keys) // 2
+        self._keys[index:index + 1] = [keys[:half], keys[half:]]
+        self._users[index:index + 1] = [users[:half], users[half:]]
+        self._maxes[index:index + 1] = [keys[half - 1], keys[-1]]
@@ -0,0 +1,138 @@
+import heapq
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+
+# Builds the home timelines of users from the posts of the users they follow.
+
+class FeedCache:
+    """
+    Home timelines of users, newest post first, kept in an LRU cache.
+
+    A timeline is built by a k-way merge (with a heap) of the post lists of the followed users,
+    reading each list from its newest post, so it costs about limit * log(followed users)
+    instead of the total number of posts.
+    The cache listens to the graph and updates the cached timelines incrementally:
+    a published post is put at the head of the cached timelines of the followers of its author,
+    a follow merges the posts of the followed user in and an unfollow filters them out.
+
+    Attributes:
+        graph (SocialGraph): The graph of the users.
+        capacity (int): The maximal number of cached timelines.
+        page_size (int): The minimal number of posts computed for a timeline.
+        entries (OrderedDict): Cached timelines keyed by user id, least recently used first.
+            Each entry is [posts, complete] where complete tells if posts holds all the posts of the followed users.
+    """
+
+    def __init__(self, graph, capacity: int = 1024, page_size: int = 50):
+        self.graph = graph
+        self.capacity = capacity
+        self.page_size = page_size
+        self.entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    """
+    Returns the latest limit posts of the users followed by user, newest first, none if limit isn't positive.
+    """
+
+    def timeline(self, user, limit: int = 20) -> list:
+        if limit <= 0:
+            return []
+        with self._lock:
+            entry = self.entries.get(user.uid)
+            if entry is not None and (entry[1] or len(entry[0]) >= limit):
+                self.entries.move_to_end(user.uid)
+                return entry[0][:limit]
+            size = max(limit, self.page_size)
+            users = self.graph.users
+            posts = list(islice(self._merge([users[uid].posts for uid in self.graph.following[user.uid]]), size))
+            self.entries[user.uid] = [posts, len(posts) < size]
+            self.entries.move_to_end(user.uid)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return posts[:limit]
+
+    """
+    Drops the cached timeline of user, or all of them.
+    """
+
+    def invalidate(self, user=None):
+        with self._lock:
+            if user is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user.uid, None)
+
+    """
+    Puts a new post at the head of the cached timelines of the followers of its author.
+    Goes over the cached timelines or over the followers, whichever is smaller.
+    """
+
+    def on_publish(self, author, post):
+        with self._lock:
+            if not self.entries:
+                return
+            followers = self.graph.followers[author.uid]
+            if len(self.entries) <= len(followers):
+                uids = [uid for uid in self.entries if self.graph.is_following(uid, author.uid)]
+            else:
+                uids = [uid for uid in followers if uid in self.entries]
+            for uid in uids:
+                entry = self.entries[uid]
+                if self._insert(entry[0], post, entry[1]) and not entry[1]:
+                    entry[0].pop()
+
+    """
+    Merges the posts of the followed user into the cached timeline of user.
+    """
+
+    def on_follow(self, user, followed):
+        with self._lock:
+            entry = self.entries.get(user.uid)
+            if entry is None:
+                return
+            posts, complete = entry
+            # A partial timeline stays correct only up to its current length
+            size = max(len(posts), self.page_size) if complete else len(posts)
+            merged = list(islice(self._merge([posts[::-1], followed.posts]), size + 1))
+            entry[1] = complete and len(merged) <= size
+            entry[0] = merged[:size]
+
+    """
+    Removes the posts of the unfollowed user from the cached timeline of user.
+    If too few posts are left the timeline is rebuilt on the next read.
+    """
+
+    def on_unfollow(self, user, unfollowed):
+        with self._lock:
+            entry = self.entries.get(user.uid)
+            if entry is not None:
+                entry[0] = [post for post in entry[0] if post.author is not unfollowed]
+
+    """
+    Inserts post at its place in posts (newest first), which is the head unless posts were
+    published concurrently. Returns False if the post is already there (the timeline was rebuilt
+    after it was published) or if it would go after the end of a partial timeline.
+    """
+
+    @staticmethod
+    def _insert(posts, post, complete: bool) -> bool:
+        index = 0
+        while index < len(posts) and posts[index].post_id > post.post_id:
+            index += 1
+        if index < len(posts) and posts[index] is post:
+            return False
+        if index == len(posts) and not complete:
+            return False
+        posts.insert(index, post)
+        return True
+
+    """
+    Merges post lists kept oldest first into one iterator, newest first.
+    """
+
+    @staticmethod
+    def _merge(post_lists):
+        return heapq.merge(*(reversed(posts) for posts in post_lists if posts),
+                           key=lambda post: post.post_id, reverse=True)
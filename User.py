@@ -1,14 +1,17 @@
-from abc import ABC, abstractmethod
+from abc import ABC
 from PostFactory import PostFactory
-from Exceptions import UsertoUserError
-from Exceptions import NotOnlineNotificationError
+from SocialGraph import UsersView, default_graph
+from Notification import Notification, Inbox
+import EventSink
+import Concurrency
+from Exceptions import ensure_can_follow, ensure_can_unfollow, ensure_can_publish
 
 
 # Observer Design Pattern:
-# The User and UserFollower classes demonstrate the Observer design pattern.
-# User objects act as subjects, and UserFollower objects act as observers.
-# When a User publishes a new post, it notifies all its followers (UserFollower objects)
-# by calling the update method on each observer, passing the notification message.
+# Users act as subjects and their followers, stored as edges of the graph, as observers.
+# When a User publishes a new post, it notifies all its followers through the fan-out engine
+# of its graph, which formats the notification message once and delivers it in batches.
+# Other observers (feeds, indexes, logs) subscribe to the graph and receive its on_<event> calls.
 
 class User(ABC):
     """
@@ -17,20 +20,24 @@ class User(ABC):
     Attributes:
         username (str): The username of the user.
         password (str): The password of the user.
-        followers (list): List of users who follow this user.
-        following (list): List of users this user follows.
-        posts (list): List of posts published by this user.
-        notifications (list): List of notifications for this user.
+        followers (UsersView): The users who follow this user.
+        following (UsersView): The users this user follows.
+        posts (list): List of posts published by this user, oldest first.
+        notifications (Inbox): Bounded inbox of the notifications (Notification records) for this user.
         connected (bool): Indicates whether the user is currently connected to the network.
+        graph (SocialGraph): The graph storing the follow relations of the user.
+        uid (int): The id of the user in the graph.
    """
 
-    def __init__(self, username: str, password: str):
-        self.followers = []
-        self.following = []
+    __slots__ = ("graph", "uid", "username", "password", "posts", "notifications", "connected")
+
+    def __init__(self, username: str, password: str, graph=None):
+        self.graph = graph if graph is not None else default_graph
+        self.uid = self.graph.add_user(self)
         self.username = username
         self.password = password
         self.posts = []
-        self.notifications = []
+        self.notifications = Inbox()
         self.connected = True
 
     """
@@ -51,27 +58,25 @@ class User(ABC):
 
     """
     Allows the user to follow another users.
-    adding the followed user to the following list
-    becomes an observer of the followed user by creating instance of UserFollower.
+    adds an edge to the graph, so the user receives the posts of the followed user.
+    Following an already followed user has no effect on the graph.
     Raises:
        UsertoUserError: user cant follow itself.
                         user cant follow while is not online
-
+                        user cant follow a user of another network
     """
 
     def follow(self, user):
-        exception = UsertoUserError(self, user)
-        exception.cantFollow(self, user)
-        exception.cantFollowYourSelf()
-        self.following.append(user)
-        follower = UserFollower(self)
-        user.followers.append(follower)
-        print(self.username + " started following " + user.username)
+        with Concurrency.users.hold(self.uid, user.uid):
+            ensure_can_follow(self, user)
+            self.graph.follow(self.uid, user.uid)
+        EventSink.emit("follow", self.username + " started following " + user.username,
+                       user=self.username, followed=user.username)
 
     """
     Allows the user to unfollow another users.
-    removes the followed user from the following list
-    removing user from observers of the unfollowed user.
+    removes the edge from the graph, so the user stops observing the unfollowed user.
+    The notifications of pulled authors published before the unfollow are pulled first.
     Raises:
        UsertoUserError: user cant unfollow itself.
                         user cant unfollow while is not online
@@ -79,24 +84,22 @@ class User(ABC):
     """
 
     def unfollow(self, user):
-        exception = UsertoUserError(self, user)
-        exception.cantUnFollow(self, user)
-        exception.cantFollowYourSelf()
-        exception.cantUnfollowIsntFollowed()
-        self.following.remove(user)
-        # Remove current user from the following list of the unfollowed user
-        for follower in user.followers:
-            if follower.get_user() == self:
-                user.followers.remove(follower)
-                print(self.username + " unfollowed " + user.username)
+        with Concurrency.users.hold(self.uid, user.uid):
+            ensure_can_unfollow(self, user)
+            # The notifications of a pulled author are found through the edge, so they're pulled before it goes
+            self.graph.fanout.pull(self.uid)
+            self.graph.unfollow(self.uid, user.uid)
+        EventSink.emit("unfollow", self.username + " unfollowed " + user.username,
+                       user=self.username, unfollowed=user.username)
 
     """
     Notifies the user's followers about a new post.
+    A single notification record is shared by all the followers,
+    the delivery is done by the fan-out engine of the graph and may be deferred.
     """
 
-    def notify(self):
-        for follower in self.followers:
-            follower.update(f"{self.username} has a new post")
+    def notify(self, post=None):
+        self.graph.fanout.publish(self.uid, Notification(Notification.NEW_POST, self, post))
 
     """
     Publishes a new post of the specified type.
@@ -118,72 +121,67 @@ class User(ABC):
 
     def publish_post(self, post_type, *args, **kwargs):
         post = PostFactory.create_post(post_type, *args, **kwargs, author=self)
-        exception = NotOnlineNotificationError(self, post)
-        exception.cantPublish()
-        self.posts.append(post)
-        print(self.username + post.notification() + "\n")
-        self.notify()
+        with Concurrency.users.lock(self.uid):
+            ensure_can_publish(self, post)
+            self.graph.add_post(post)
+            # Nobody can like or comment the post before the listeners got it
+            with Concurrency.posts.lock(post.post_id):
+                self.posts.append(post)
+                self.graph.emit("on_publish", self, post)
+        EventSink.emit("publish", self.username + post.notification() + "\n",
+                       user=self.username, post_id=post.post_id)
+        self.notify(post)
         return post
 
     """
     adds notification to notifications list of the user
     """
 
-    def add_notification(self, notification: str):
+    def add_notification(self, notification: Notification):
         self.notifications.append(notification)
 
     """
-    Prints the notifications of the user
+    Returns a page of (sequence, notification) pairs of the user.
+    With after=None the latest page is returned, otherwise the notifications received after that sequence.
     """
 
-    def print_notifications(self):
-        print(self.username + "'s notifications:")
-        for notification in self.notifications:
-            print(notification)
-
-    """
-    Method to print user data
-    """
-
-    def __str__(self):
-        return "User name: " + self.username + ", Number of posts: " + str(
-            len(self.posts)) + ", Number of followers: " + str(len(self.followers))
-
+    def get_notifications(self, after: int = None, limit: int = 20):
+        self.graph.fanout.pull(self.uid)
+        return self.notifications.get_notifications(after, limit)
 
-class Follower(ABC):
     """
-    Abstract base class representing a follower of a user.
-
-    Updates the follower with a new notification.
-
+    Prints the notifications of the user, rendering their text
+    including the new posts of followed users with too many followers to be pushed
+    and marks them as read
     """
 
-    @abstractmethod
-    def update(self, notification: str):
-        pass
-
+    def print_notifications(self):
+        self.graph.fanout.pull(self.uid)
+        print(self.username + "'s notifications:")
+        for notification in self.notifications:
+            print(notification)
+        self.notifications.mark_read()
 
-class UserFollower(Follower):
     """
-    Represents a follower of a user in the social network.
-
-    Attributes:
-        user (User): The user being followed.
+    The users who follow this user, read from the graph.
     """
 
-    def __init__(self, user):
-        self.user = user
+    @property
+    def followers(self):
+        return UsersView(self.graph, self.uid, False)
 
     """
-    Updates the follower with a new notification.
+    The users this user follows, read from the graph.
     """
 
-    def update(self, notification: str):
-        self.user.add_notification(notification)
+    @property
+    def following(self):
+        return UsersView(self.graph, self.uid, True)
 
     """
-    Returns the user being followed.
+    Method to print user data
     """
 
-    def get_user(self):
-        return self.user
\ No newline at end of file
+    def __str__(self):
+        return "User name: " + self.username + ", Number of posts: " + str(
+            len(self.posts)) + ", Number of followers: " + str(self.graph.follower_count(self.uid))
@@ -0,0 +1,349 @@
+import os
+import re
+import struct
+import threading
+import zlib
+from PostFactory import TextPost, ImagePost
+import EventSink
+
+
+# Makes the changes of a social network durable between snapshots.
+#
+# The log directory holds snapshot-<lsn>.bin files, each one covering the records up to its lsn,
+# and wal-<lsn>.log files holding the records from their lsn on.
+# Every record is: length (u32), crc32 of the rest (u32), lsn (u64), operation (u8), payload.
+# Users and posts are referred to by their id in the graph, which replay reproduces.
+
+SIGN_UP, LOG_IN, LOG_OUT, FOLLOW, UNFOLLOW, PUBLISH, LIKE, COMMENT, DISCOUNT, SOLD, TIMED_COMMENT, AVAILABLE = range(12)
+
+_SNAPSHOT = re.compile(r"snapshot-(\d+)\.bin$")
+_LOG = re.compile(r"wal-(\d+)\.log$")
+
+
+class WriteAheadLog:
+    """
+    Append only log of the changes of a social network, with group commit and compaction.
+
+    Attached to a network, the log listens to its graph and appends a record for every
+    sign up, log in, log out, follow, unfollow, published post, like, comment, discount, sale
+    and item put back on sale.
+    Records are buffered and written with one fsync per group: when group_size records are
+    buffered, on commit, and by a background thread at most interval seconds after they were appended.
+    Every compact_every records a compaction is due: the next commit saves the network to a new snapshot
+    and drops the older log. It never runs from an append, which happens in the middle of an action.
+    recover rebuilds a network from the newest snapshot and the log records that follow it.
+
+    Attributes:
+        directory (str): The directory of the snapshots and log files.
+        group_size (int): The number of buffered records that triggers a commit.
+        interval (float): The maximal number of seconds a record stays buffered, 0 to commit only on demand.
+        compact_every (int): The number of records between automatic compactions (run by commit), 0 to disable them.
+        lsn (int): The sequence number of the last record.
+        network (SocialNetwork): The attached network.
+        graph (SocialGraph): The graph the log listens to, kept since loading a network replaces network.graph.
+    """
+
+    def __init__(self, directory: str, group_size: int = 64, interval: float = 0.05, compact_every: int = 0):
+        self.directory = directory
+        self.group_size = group_size
+        self.interval = interval
+        self.compact_every = compact_every
+        self.network = None
+        self.graph = None
+        self.lsn = 0
+        self._buffer = []
+        self._since_compaction = 0
+        self._file = None
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._flusher = None
+        os.makedirs(directory, exist_ok=True)
+
+    """
+    Rebuilds the network from the newest snapshot and the log tail, attaches the log to it and returns it.
+    Without a snapshot, a new network named name is created first.
+    The replayed changes aren't sent to the event sink.
+    """
+
+    def recover(self, network_class, name: str = "Twitter"):
+        snapshots = self._files(_SNAPSHOT)
+        if snapshots:
+            base, path = snapshots[-1]
+            network = network_class.load(path)
+        else:
+            base = 0
+            network = network_class(name)
+        self.lsn = base
+        sink = EventSink.set_sink(EventSink.NullSink())
+        try:
+            for start, path in self._files(_LOG):
+                end = 0
+                for lsn, operation, payload, end in self._read(path):
+                    if lsn > base:
+                        self._apply(network, operation, payload)
+                    self.lsn = max(self.lsn, lsn)
+                if end < os.path.getsize(path):
+                    # Drop the torn tail so new records aren't appended after it
+                    os.truncate(path, end)
+        finally:
+            EventSink.set_sink(sink)
+        self.attach(network)
+        return network
+
+    """
+    Starts logging the changes of network into a new log file.
+    """
+
+    def attach(self, network):
+        self.detach()
+        self.network = network
+        self.graph = network.graph
+        self._file = open(os.path.join(self.directory, "wal-%020d.log" % (self.lsn + 1)), "ab")
+        self.graph.subscribe(self)
+        if self.interval > 0:
+            self._stopped.clear()
+            self._flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+            self._flusher.start()
+
+    """
+    Stops logging, committing the buffered records.
+    """
+
+    def detach(self):
+        if self.network is None:
+            return
+        self.graph.unsubscribe(self)
+        if self._flusher is not None:
+            self._stopped.set()
+            self._flusher.join()
+            self._flusher = None
+        self.commit()
+        self._file.close()
+        self._file = None
+        self.network = None
+        self.graph = None
+
+    """
+    Writes the buffered records and waits until they reach the disk,
+    then runs the compaction due after compact_every records, if any.
+    Call it from the thread owning the network between actions, not from a listener.
+    """
+
+    def commit(self):
+        with self._lock:
+            self._flush()
+            if self.compact_every and self._since_compaction >= self.compact_every:
+                self.checkpoint()
+
+    def _flush(self):
+        with self._lock:
+            if self._buffer:
+                self._file.write(b"".join(self._buffer))
+                self._buffer = []
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    """
+    Saves the network to a snapshot covering all the records so far,
+    then drops the older snapshots and log files.
+    No action must be in progress on the network, the snapshot would hold part of it.
+    """
+
+    def checkpoint(self):
+        with self._lock:
+            self._flush()
+            network = self.network
+            path = os.path.join(self.directory, "snapshot-%020d.bin" % self.lsn)
+            network.save(path + ".tmp")
+            with open(path + ".tmp", "rb") as file:
+                os.fsync(file.fileno())
+            os.replace(path + ".tmp", path)
+            # Once the snapshot is durable the records it covers aren't needed anymore
+            self._file.close()
+            self._file = open(os.path.join(self.directory, "wal-%020d.log" % (self.lsn + 1)), "ab")
+            for lsn, old in self._files(_SNAPSHOT):
+                if lsn < self.lsn:
+                    os.remove(old)
+            for start, old in self._files(_LOG):
+                if start <= self.lsn:
+                    os.remove(old)
+            self._since_compaction = 0
+
+    """
+    Commits the buffered records and closes the log.
+    """
+
+    def close(self):
+        self.detach()
+
+    def on_sign_up(self, user):
+        self._append(SIGN_UP, _string(user.username) + _string(user.password))
+
+    def on_log_in(self, user):
+        self._append(LOG_IN, struct.pack("<I", user.uid))
+
+    def on_log_out(self, user):
+        self._append(LOG_OUT, struct.pack("<I", user.uid))
+
+    def on_follow(self, user, followed):
+        self._append(FOLLOW, struct.pack("<II", user.uid, followed.uid))
+
+    def on_unfollow(self, user, unfollowed):
+        self._append(UNFOLLOW, struct.pack("<II", user.uid, unfollowed.uid))
+
+    def on_publish(self, user, post):
+        payload = struct.pack("<Id", user.uid, post.timestamp)
+        if isinstance(post, TextPost):
+            payload += b"T" + _string(post.content)
+        elif isinstance(post, ImagePost):
+            payload += b"I" + _string(post.path)
+        else:
+            payload += b"S" + _string(post.item) + _number(post.price) + _string(post.location)
+        self._append(PUBLISH, payload)
+
+    def on_like(self, post, user):
+        self._append(LIKE, struct.pack("<II", post.post_id, user.uid))
+
+    def on_comment(self, post, user, text):
+        # The event is emitted right after the comment was appended, under the lock of the post
+        timestamp = post.comments.times[-1]
+        self._append(TIMED_COMMENT, struct.pack("<IId", post.post_id, user.uid, timestamp) + _string(text))
+
+    def on_discount(self, post, dis):
+        self._append(DISCOUNT, struct.pack("<Id", post.post_id, dis))
+
+    def on_sold(self, post):
+        self._append(SOLD, struct.pack("<I", post.post_id))
+
+    def on_available(self, post):
+        self._append(AVAILABLE, struct.pack("<I", post.post_id))
+
+    def _append(self, operation: int, payload: bytes):
+        with self._lock:
+            self.lsn += 1
+            body = struct.pack("<QB", self.lsn, operation) + payload
+            self._buffer.append(struct.pack("<II", len(body), zlib.crc32(body)) + body)
+            if len(self._buffer) >= self.group_size:
+                self._flush()
+            self._since_compaction += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if self._buffer:
+                self._flush()
+
+    """
+    Returns the (lsn, path) pairs of the files matching pattern, sorted by lsn.
+    """
+
+    def _files(self, pattern):
+        files = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                files.append((int(match.group(1)), os.path.join(self.directory, name)))
+        files.sort()
+        return files
+
+    """
+    Yields the (lsn, operation, payload, end offset) records of a log file.
+    Stops at the first torn or corrupted record, which can only be the tail of an interrupted commit.
+    """
+
+    @staticmethod
+    def _read(path: str):
+        with open(path, "rb") as file:
+            end = 0
+            while True:
+                header = file.read(8)
+                if len(header) < 8:
+                    return
+                length, crc = struct.unpack("<II", header)
+                body = file.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    return
+                lsn, operation = struct.unpack_from("<QB", body)
+                end += 8 + length
+                yield lsn, operation, memoryview(body)[9:], end
+
+    @staticmethod
+    def _apply(network, operation: int, payload):
+        graph = network.graph
+        users = graph.users
+        if operation == SIGN_UP:
+            username, offset = _read_string(payload, 0)
+            password, offset = _read_string(payload, offset)
+            network.sign_up(username, password)
+        elif operation == LOG_IN:
+            user = users[struct.unpack_from("<I", payload)[0]]
+            network.log_in(user.username, user.password)
+        elif operation == LOG_OUT:
+            network.log_out(users[struct.unpack_from("<I", payload)[0]].username)
+        elif operation == FOLLOW:
+            a, b = struct.unpack_from("<II", payload)
+            users[a].follow(users[b])
+        elif operation == UNFOLLOW:
+            a, b = struct.unpack_from("<II", payload)
+            users[a].unfollow(users[b])
+        elif operation == PUBLISH:
+            uid, timestamp = struct.unpack_from("<Id", payload)
+            kind = bytes(payload[12:13])
+            if kind == b"T":
+                content, _ = _read_string(payload, 13)
+                post = users[uid].publish_post("Text", content)
+            elif kind == b"I":
+                path, _ = _read_string(payload, 13)
+                post = users[uid].publish_post("Image", path)
+            else:
+                item, offset = _read_string(payload, 13)
+                price, offset = _read_number(payload, offset)
+                location, _ = _read_string(payload, offset)
+                post = users[uid].publish_post("Sale", item, price, location)
+            post.timestamp = timestamp
+        elif operation == LIKE:
+            post, uid = struct.unpack_from("<II", payload)
+            graph.posts[post].like(users[uid])
+        elif operation == COMMENT:
+            post, uid = struct.unpack_from("<II", payload)
+            text, _ = _read_string(payload, 8)
+            graph.posts[post].comment(users[uid], text)
+        elif operation == TIMED_COMMENT:
+            post, uid, timestamp = struct.unpack_from("<IId", payload)
+            text, _ = _read_string(payload, 16)
+            post = graph.posts[post]
+            post.comment(users[uid], text)
+            post.comments.times[-1] = timestamp
+        elif operation == DISCOUNT:
+            post, dis = struct.unpack_from("<Id", payload)
+            post = graph.posts[post]
+            post.discount(int(dis) if dis.is_integer() else dis, post.author.password)
+        elif operation == SOLD:
+            post = graph.posts[struct.unpack_from("<I", payload)[0]]
+            post.sold(post.author.password)
+        elif operation == AVAILABLE:
+            graph.posts[struct.unpack_from("<I", payload)[0]].sold(None)
+        else:
+            raise Exception("Unknown log operation " + str(operation))
+
+
+def _string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("<I", len(data)) + data
+
+
+def _read_string(payload, offset: int):
+    size, = struct.unpack_from("<I", payload, offset)
+    offset += 4
+    return bytes(payload[offset:offset + size]).decode("utf-8"), offset + size
+
+
+def _number(value) -> bytes:
+    if isinstance(value, int):
+        return struct.pack("<Bq", 0, value)
+    return struct.pack("<Bd", 1, value)
+
+
+def _read_number(payload, offset: int):
+    is_float, = struct.unpack_from("<B", payload, offset)
+    value, = struct.unpack_from("<d" if is_float else "<q", payload, offset + 1)
+    return value, offset + 9
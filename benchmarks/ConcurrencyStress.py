@@ -0,0 +1,143 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Concurrency
+import EventSink
+from Notification import Inbox
+from SocialNetwork import SocialNetwork
+
+
+# Multi-threaded stress test of the concurrency mode.
+#
+# Several threads follow, unfollow, like, comment and publish at the same time, then the graph,
+# the likes and the inboxes are compared with what the threads did.
+# Run from the repository root: python benchmarks/ConcurrencyStress.py [--threads 8]
+# The exit status is 1 if a follow, like, comment or notification was lost or corrupted.
+
+
+"""
+Returns True if every edge of the graph is stored on both sides with matching positions.
+"""
+
+def edges_consistent(graph) -> bool:
+    for a, following in enumerate(graph.following):
+        for i, b in enumerate(following):
+            j = graph.following_pos[a][i]
+            if graph.followers[b][j] != a or graph.followers_pos[b][j] != i:
+                return False
+    return True
+
+
+"""
+Every thread follows its share of all the user pairs, unfollows some of them again,
+then likes and comments the post of the followed user.
+Returns (ok, seconds, errors).
+"""
+
+def interactions(threads: int, users: int = 40) -> tuple:
+    network = SocialNetwork("Stress")
+    members = [network.sign_up("u" + str(i), "pass1") for i in range(users)]
+    posts = [user.publish_post("Text", "post") for user in members]
+    pairs = [(a, b) for a in range(users) for b in range(users) if a != b]
+    random.Random(0).shuffle(pairs)
+    shares = [pairs[k::threads] for k in range(threads)]
+    errors = []
+
+    def work(k):
+        rand = random.Random(k)
+        try:
+            for a, b in shares[k]:
+                members[a].follow(members[b])
+                if rand.random() < 0.3:
+                    members[a].unfollow(members[b])
+                posts[b].like(members[a])
+                posts[b].comment(members[a], "comment")
+        except Exception as error:
+            errors.append(repr(error))
+
+    elapsed = run_threads(work, threads)
+    expected = set()
+    for k in range(threads):
+        rand = random.Random(k)
+        for pair in shares[k]:
+            if not rand.random() < 0.3:
+                expected.add(pair)
+    graph = network.graph
+    ok = {(a, b) for a in range(users) for b in graph.following[a]} == expected
+    ok = ok and edges_consistent(graph)
+    ok = ok and all(len(post.likes) == users - 1 and len(post.comments) == users - 1 for post in posts)
+    # Every like and every comment notifies the author of the post
+    received = sum(user.notifications.total for user in members)
+    ok = ok and received == sum(len(user.notifications) for user in members) == 2 * users * (users - 1)
+    return ok, elapsed, errors
+
+
+"""
+Every thread follows and unfollows its share of the user pairs over and over and publishes
+between the rounds, the last round leaves every pair followed.
+Returns (ok, seconds, errors).
+"""
+
+def churn(threads: int, users: int = 16, rounds: int = 300) -> tuple:
+    network = SocialNetwork("Churn")
+    members = [network.sign_up("u" + str(i), "pass1") for i in range(users)]
+    pairs = [(a, b) for a in range(users) for b in range(users) if a != b]
+    random.Random(0).shuffle(pairs)
+    shares = [pairs[k::threads] for k in range(threads)]
+    errors = []
+
+    def work(k):
+        try:
+            for round_ in range(rounds):
+                for a, b in shares[k]:
+                    members[a].follow(members[b])
+                if round_ < rounds - 1:
+                    for a, b in shares[k]:
+                        members[a].unfollow(members[b])
+                members[k % users].publish_post("Text", "round " + str(round_))
+        except Exception as error:
+            errors.append(repr(error))
+
+    elapsed = run_threads(work, threads)
+    graph = network.graph
+    ok = {(a, b) for a in range(users) for b in graph.following[a]} == set(pairs)
+    ok = ok and edges_consistent(graph) and len(graph.posts) == threads * rounds
+    return ok, elapsed, errors
+
+
+def run_threads(work, threads: int) -> float:
+    workers = [threading.Thread(target=work, args=(k,)) for k in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-threaded stress test of the concurrency mode.")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    EventSink.set_sink(EventSink.NullSink())
+    # Keep every notification so none is dropped by the bounded inboxes
+    Inbox.DEFAULT_CAPACITY = 10 ** 7
+    # Switch threads as often as possible to interleave the actions
+    sys.setswitchinterval(1e-6)
+    Concurrency.enable()
+    passed = True
+    for name, test in (("interactions", interactions), ("churn", churn)):
+        ok, elapsed, errors = test(args.threads)
+        print("%-12s %s  %.2fs  %s" % (name, "ok" if ok and not errors else "FAILED", elapsed, errors[:2]))
+        passed = passed and ok and not errors
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import EventSink
+from SocialNetwork import SocialNetwork
+import Exceptions
+
+
+# Microbenchmark of the action checks (guards of Exceptions) and of the actions calling them,
+# on the happy path where every check passes.
+# Run from the repository root: python benchmarks/GuardBenchmark.py
+
+
+"""
+Returns the best time of one run of statement in nanoseconds, out of repeat rounds of number runs.
+"""
+
+def best(statement: str, names: dict, number: int = 200000, repeat: int = 5) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=repeat, globals=names)) / number * 1e9
+
+
+def main():
+    EventSink.set_sink(EventSink.NullSink())
+    network = SocialNetwork("Guards")
+    alice = network.sign_up("alice", "pass123")
+    bob = network.sign_up("bob", "pass123")
+    post = alice.publish_post("Text", "hello")
+    names = {"Exceptions": Exceptions, "network": network, "alice": alice, "bob": bob, "post": post}
+    for label, statement in (
+            ("like check", "Exceptions.ensure_can_like(bob, post)"),
+            ("follow check", "Exceptions.ensure_can_follow(bob, alice)"),
+            ("log out check", "Exceptions.ensure_can_log_out(network, 'bob')"),
+            ("like", "post.like(bob)"),
+            ("comment", "post.comment(bob, 'hi')"),
+            ("follow", "bob.follow(alice)")):
+        print("%-14s %8.0f ns" % (label, best(statement, names)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import EventSink
+from SocialNetwork import SocialNetwork
+
+
+# Memory taken by posts and likes, and time of the likes of one viral post.
+# Run from the repository root: python benchmarks/MemoryBenchmark.py
+
+
+"""
+Publishes text posts and likes them, tracing the allocations.
+Returns the bytes per post and per like (the like notification of the author included).
+"""
+
+def posts_and_likes(users: int = 2000, posts: int = 20000, likes: int = 200000) -> tuple:
+    network = SocialNetwork("Memory")
+    members = [network.sign_up("u" + str(i), "pass123") for i in range(users)]
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    published = [members[i % users].publish_post("Text", "hello") for i in range(posts)]
+    gc.collect()
+    middle = tracemalloc.get_traced_memory()[0]
+    for i in range(likes):
+        published[i % posts].like(members[(i * 7 + 1) % users])
+    gc.collect()
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (middle - base) / posts, (end - middle) / likes
+
+
+"""
+Likes one post by every user, in random order.
+Returns the seconds taken and the bytes of its likers per like.
+"""
+
+def viral_post(users: int = 300000) -> tuple:
+    network = SocialNetwork("Viral")
+    members = network.bulk_sign_up(("u" + str(i), "pass123") for i in range(users)).done
+    post = members[0].publish_post("Text", "viral")
+    order = list(range(users))
+    random.Random(0).shuffle(order)
+    start = time.perf_counter()
+    for uid in order:
+        post._add_liker(uid)
+    elapsed = time.perf_counter() - start
+    return elapsed, sys.getsizeof(post.likers) / users
+
+
+def main():
+    EventSink.set_sink(EventSink.NullSink())
+    per_post, per_like = posts_and_likes()
+    print("bytes per post %.0f, bytes per like %.0f (like notification included)" % (per_post, per_like))
+    elapsed, per_liker = viral_post()
+    print("300k random likes of one post %.2fs, %.1f bytes per liker" % (elapsed, per_liker))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import sys
 from SocialNetwork import SocialNetwork
 
 
@@ -99,4 +100,9 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    # python main.py ingest events.jsonl replays an action log instead of the demo
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        import Ingest
+        Ingest.main(sys.argv[2:])
+    else:
+        main()